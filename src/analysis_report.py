@@ -1,12 +1,53 @@
-from fastapi import HTTPException, Depends
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import HTTPException, Depends, Response
 from sqlalchemy.orm import Session
 
 from src import crud
+from src.db_stats_collector import to_json_bytes
+
+# Entries are keyed by (task_id, version token, ...); a finished report never changes,
+# so repeated dashboard polls are served without re-projecting or re-encoding it.
+VIZ_CACHE_SIZE = 256
+RESPONSE_CACHE_SIZE = 256
+
+
+class _LRUCache:
+    """Small thread-safe LRU for per-task-version payloads."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[tuple, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: tuple, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+# Visualization payloads of tasks saved before db_analysis_viz existed
+_viz_cache = _LRUCache(VIZ_CACHE_SIZE)
+# Encoded JSON bodies of finished reports (without raw_report, which is too large to keep)
+_response_cache = _LRUCache(RESPONSE_CACHE_SIZE)
 
 
 def create_analysis_report(
         task_id: str,
-        db: Session
+        db: Session,
+        include_raw: bool = False,
+        if_none_match: Optional[str] = None
 ):
     """
     Retrieve the comprehensive database analysis report.
@@ -26,56 +67,129 @@ def create_analysis_report(
     - Priority matrices for recommendations
 
     Perfect for generating dashboards and detailed performance reports.
+
+    The source report is only embedded as `raw_report` when `include_raw` is set,
+    since it roughly doubles the payload size.
+
+    Finished reports carry an `ETag`; a matching `If-None-Match` gets an empty 304.
     """
-    task = crud.get_task(db, task_id)
-    if not task:
+    # The version columns alone decide 304s and cache hits, so the JSON payloads
+    # are only loaded when the body actually has to be built
+    version = crud.get_task_version(db, task_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    etag = _report_etag(version, include_raw)
+    headers = {"ETag": etag} if etag else None
+    if etag and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    # Only finished reports are immutable, so only those are worth keeping encoded
+    cache_key = (version.id, version.completed_at) if version.completed_at and not include_raw else None
+    body = _response_cache.get(cache_key) if cache_key else None
+    if body is not None:
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    task = crud.get_task_report(db, task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
 
     if not task.db_analysis_report:
         return {"message": "Analysis report has not been generated yet."}
 
-    raw_report = task.db_analysis_report
+    # Precomputed when the report was saved; older tasks are projected on read
+    viz_data = task.db_analysis_viz or _get_cached_viz(task)
 
-    # Helper functions to safely extract data
-    def get_bottleneck_by_type(bottleneck_type: str):
-        """Find a specific bottleneck by type."""
-        bottlenecks = raw_report.get('performance_bottlenecks', [])
-        return next((b for b in bottlenecks if b.get('type') == bottleneck_type), None)
+    if include_raw:
+        # Cached payloads are shared between requests, so never mutate them in place
+        body = to_json_bytes({"raw_report": task.db_analysis_report, **viz_data})
+        return Response(content=body, media_type="application/json", headers=headers)
 
-    def get_top_queries():
-        """Get top queries from slow_queries or high_volume_queries."""
-        # First try high_volume_queries since that's what the chart shows
-        high_volume = get_bottleneck_by_type('high_volume_queries')
-        if high_volume and 'details' in high_volume:
-            return [
-                {
-                    "id": detail.get('query_id', 'Unknown')[:8] + "...",
-                    "executions": detail.get('run_quantity', 0),
-                    "avg_time": detail.get('execution_time', 'N/A')
-                }
-                for detail in high_volume['details'][:5]
-            ]
+    body = to_json_bytes(viz_data)
+    if cache_key:
+        _response_cache.put(cache_key, body)
+    return Response(content=body, media_type="application/json", headers=headers)
 
-        # Fallback to slow_queries if high_volume not available
-        slow_queries = get_bottleneck_by_type('slow_queries')
-        if slow_queries and 'details' in slow_queries:
-            return [
-                {
-                    "id": detail.get('query_id', 'Unknown')[:8] + "...",
-                    "executions": detail.get('run_quantity', 0),
-                    "avg_time": detail.get('execution_time', 'N/A')
-                }
-                for detail in slow_queries['details'][:5]
-            ]
 
-        return []
+def _report_etag(task, include_raw: bool) -> Optional[str]:
+    """Entity tag of a finished report; None while the task may still change."""
+    if not task.completed_at:
+        return None
+    variant = "-raw" if include_raw else ""
+    return f'"{task.id}-{task.completed_at.timestamp():.6f}{variant}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header (a tag list or `*`) against `etag`."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _get_cached_viz(task) -> dict:
+    """Build the visualization payload for a task without a stored one, memoized per task version."""
+    # completed_at changes when the task finishes, so it busts entries built mid-run
+    version_token = task.completed_at.isoformat() if task.completed_at else None
+    cache_key = (task.id, version_token)
+    viz_data = _viz_cache.get(cache_key)
+    if viz_data is None:
+        viz_data = build_analysis_viz(normalize_schema_overview(task.db_analysis_report))
+        _viz_cache.put(cache_key, viz_data)
+    return viz_data
+
+
+def _format_query_row(detail: dict) -> dict:
+    """Format a bottleneck query detail as a row of the top queries chart."""
+    get = detail.get
+    return {
+        "id": (get('query_id') or 'Unknown')[:8] + "...",
+        "executions": get('run_quantity', 0),
+        "avg_time": get('execution_time', 'N/A')
+    }
 
-    def get_total_executions():
-        """Get total executions from high_volume_queries."""
-        high_volume = get_bottleneck_by_type('high_volume_queries')
-        return high_volume.get('total_executions', 0) if high_volume else 0
 
-    # Get schema_overview from raw_report (where we stored it during processing)
+def normalize_schema_overview(raw_report: dict) -> dict:
+    """
+    Return the report with a dict `schema_overview`, building it from `schema_insights`
+    when it is missing or holds an error message (old format or failed insights step).
+    """
+    schema_overview_data = raw_report.get('schema_overview')
+    if schema_overview_data and isinstance(schema_overview_data, dict):
+        return raw_report
+
+    schema_insights = raw_report.get('schema_insights', {})
+    schema_overview_data = {
+        "tables": [
+            {
+                "name": table.get('name', 'Unknown'),
+                "column_count": table.get('column_count', 0),
+                "estimated_rows": table.get('estimated_rows', 0),
+                "has_primary_key": table.get('has_primary_key', False)
+            }
+            for table in schema_insights.get('tables', [])
+        ],
+        "index_coverage": schema_insights.get('index_coverage', {
+            "indexed_tables": 0,
+            "total_indexes": 0,
+            "coverage_percent": 0,
+            "recommendations": "No index data available"
+        })
+    }
+    return {**raw_report, "schema_overview": schema_overview_data}
+
+
+def build_analysis_viz(raw_report: dict) -> dict:
+    """Project the stored analysis report into the dashboard visualization payload."""
+
+    # Normalized by normalize_schema_overview before the report is saved
     schema_overview_data = raw_report.get('schema_overview', {})
 
     # Agent input
@@ -89,89 +203,99 @@ def create_analysis_report(
     # }
     agent_input = raw_report.get('agent_input', '')
 
+    return {
+        "schema_overview": schema_overview_data,
+        "visualizations": build_visualizations(raw_report),
+        "agent_input": agent_input
+    }
 
-    from loguru import logger
-    # logger.info(f"🟢🟢🟢🟢🟢 {schema_overview_data}")
 
-    # Fallback to old schema_insights if schema_overview doesn't exist
-    if not schema_overview_data or isinstance(schema_overview_data, str):
-        # Old format or error message - try to build from schema_insights
-        schema_insights = raw_report.get('schema_insights', {})
-        schema_overview_data = {
-            "tables": [
-                {
-                    "name": table.get('name', 'Unknown'),
-                    "column_count": table.get('column_count', 0),
-                    "estimated_rows": table.get('estimated_rows', 0),
-                    "has_primary_key": table.get('has_primary_key', False)
-                }
-                for table in schema_insights.get('tables', [])
+def build_visualizations(raw_report: dict) -> dict:
+    """Build the chart data of the dashboard from the stored analysis report."""
+
+    # Index bottlenecks once; the first entry of each type wins, as with a linear scan
+    bottlenecks_by_type = {}
+    for b in raw_report.get('performance_bottlenecks', []):
+        if isinstance(b, dict):
+            bottlenecks_by_type.setdefault(b.get('type'), b)
+
+    # Helper functions to safely extract data
+    def get_bottleneck_by_type(bottleneck_type: str):
+        """Find a specific bottleneck by type."""
+        return bottlenecks_by_type.get(bottleneck_type)
+
+    def get_top_queries():
+        """Get top queries from slow_queries or high_volume_queries."""
+        # First try high_volume_queries since that's what the chart shows,
+        # then fall back to slow_queries if high_volume is not available
+        for bottleneck_type in ('high_volume_queries', 'slow_queries'):
+            bottleneck = get_bottleneck_by_type(bottleneck_type)
+            if bottleneck and 'details' in bottleneck:
+                return [_format_query_row(detail) for detail in bottleneck['details'][:5]]
+        return []
+
+    def get_total_executions():
+        """Get total executions from high_volume_queries."""
+        high_volume = get_bottleneck_by_type('high_volume_queries')
+        return high_volume.get('total_executions', 0) if high_volume else 0
+
+    es = raw_report['executive_summary']
+    qp = raw_report['query_patterns']
+    db_prof = raw_report['database_profile']
+    si = raw_report['schema_insights']
+
+    return {
+        "executive_summary": {
+            "metrics": [
+                {"label": "Database Size", "value": f"{es['database_size']} GB",
+                 "icon": "database"},
+                {"label": "Total Rows", "value": es['total_rows'], "icon": "table"},
+                {"label": "Daily Queries", "value": f"{es['query_volume_per_day']:,}",
+                 "icon": "search"},
+                {"label": "Critical Issues", "value": es['critical_issues'],
+                 "icon": "exclamation-triangle", "alert": es['critical_issues'] > 0}
             ],
-            "index_coverage": schema_insights.get('index_coverage', {
-                "indexed_tables": 0,
-                "total_indexes": 0,
-                "coverage_percent": 0,
-                "recommendations": "No index data available"
-            })
-        }
-
-    viz_data = {
-        "raw_report": raw_report,
-        "schema_overview": schema_overview_data,
-        "visualizations": {
-            "executive_summary": {
-                "metrics": [
-                    {"label": "Database Size", "value": f"{raw_report['executive_summary']['database_size']} GB",
-                     "icon": "database"},
-                    {"label": "Total Rows", "value": raw_report['executive_summary']['total_rows'], "icon": "table"},
-                    {"label": "Daily Queries", "value": f"{raw_report['executive_summary']['query_volume_per_day']:,}",
-                     "icon": "search"},
-                    {"label": "Critical Issues", "value": raw_report['executive_summary']['critical_issues'],
-                     "icon": "exclamation-triangle", "alert": raw_report['executive_summary']['critical_issues'] > 0}
-                ],
-                "optimization_potential": raw_report['executive_summary']['optimization_potential']
-            },
-            "column_distribution": {
-                "labels": list(raw_report['database_profile']['column_distribution'].keys()),
-                "data": list(raw_report['database_profile']['column_distribution'].values()),
-                "total_columns": raw_report['schema_insights']['total_columns']
-            },
-            "query_performance": {
-                "top_queries": get_top_queries(),
-                "total_executions": get_total_executions()
-            },
-            "aggregation_usage": {
-                "labels": list(raw_report['query_patterns']['top_aggregations'].keys()),
-                "data": list(raw_report['query_patterns']['top_aggregations'].values())
-            },
-            "join_patterns": {
-                "labels": list(raw_report['query_patterns']['join_frequency'].keys()),
-                "data": list(raw_report['query_patterns']['join_frequency'].values())
-            },
-            "recommendations": {
-                "priority_matrix": [
-                    {
-                        "name": rec['type'].replace('_', ' ').title(),
-                        "priority": rec['priority'],
-                        "effort": rec['effort'],
-                        "improvement": rec['expected_improvement'],
-                        "description": rec['description']
-                    }
-                    for rec in raw_report['recommendations']
-                ],
-                "implementation_order": raw_report['implementation_priority']
-            },
-            "materialized_views": [
+            "optimization_potential": es['optimization_potential'],
+            "total_rows_numeric": db_prof.get('total_rows_numeric', 0)
+        },
+        "column_distribution": {
+            "labels": list(db_prof['column_distribution'].keys()),
+            "data": list(db_prof['column_distribution'].values()),
+            "total_columns": si['total_columns']
+        },
+        "query_performance": {
+            "top_queries": get_top_queries(),
+            "total_executions": get_total_executions(),
+            "cte_usage_percent": qp.get('cte_usage_percent')
+        },
+        "aggregation_usage": {
+            "labels": list(qp['top_aggregations'].keys()),
+            "data": list(qp['top_aggregations'].values())
+        },
+        "join_patterns": {
+            "labels": list(qp['join_frequency'].keys()),
+            "data": list(qp['join_frequency'].values())
+        },
+        "recommendations": {
+            "priority_matrix": [
                 {
-                    "aggregations": ", ".join(mv['aggregations']),
-                    "executions": mv['total_executions'],
-                    "savings": mv['potential_savings'],
-                    "queries": mv['query_count']
+                    "name": rec['type'].replace('_', ' ').title(),
+                    "priority": rec['priority'],
+                    "effort": rec['effort'],
+                    "improvement": rec['expected_improvement'],
+                    "description": rec['description']
                 }
-                for mv in raw_report['query_patterns']['materialized_view_candidates'][:3]
-            ]
+                for rec in raw_report['recommendations']
+            ],
+            "implementation_order": raw_report['implementation_priority']
         },
-        "agent_input": agent_input
+        "materialized_views": [
+            {
+                "aggregations": ", ".join(mv['aggregations']),
+                "executions": mv['total_executions'],
+                "savings": mv['potential_savings'],
+                "queries": mv['query_count']
+            }
+            for mv in qp['materialized_view_candidates'][:3]
+        ]
     }
-
-    return viz_data
\ No newline at end of file
@@ -1,8 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
 from loguru import logger
 from typing import Dict, Any
 from src.ddl_parser import DDLParser
 from src.query_analyzer import QueryAnalyzer
-from src.db_stats_collector import DatabaseStatsCollector, safe_json_serialize
+from src.db_stats_collector import DatabaseStatsCollector, to_json_bytes
 
 
 class DataAnalyzer:
@@ -23,96 +26,88 @@ class DataAnalyzer:
             'recommendations_input': {}
         }
 
-        # 1. Анализ DDL
+        # 1. Анализ DDL (быстрый; список таблиц нужен для сбора статистики БД)
         logger.info("Analyzing DDL statements...")
         if 'ddl' in input_data:
-            tables = self.ddl_parser.parse_ddl_statements(input_data['ddl'])
-            schema_stats = self.ddl_parser.get_table_stats(tables)
-
-            analysis_result['schema_analysis'] = {
-                'tables': [
-                    {
-                        'full_name': f"{t.catalog}.{t.schema}.{t.name}",
-                        'catalog': t.catalog,
-                        'schema': t.schema,
-                        'name': t.name,
-                        'columns': [
-                            {'name': c.name, 'type': c.data_type}
-                            for c in t.columns
-                        ]
-                    }
-                    for t in tables
-                ],
-                'statistics': schema_stats
-            }
-
-        # 2. Анализ запросов
-        logger.info("Analyzing SQL queries...")
-        if 'queries' in input_data:
-            query_patterns = self.query_analyzer.analyze_queries(input_data['queries'])
-            query_stats = self.query_analyzer.get_query_statistics(query_patterns)
+            analysis_result['schema_analysis'] = self._analyze_ddl(input_data['ddl'])
 
-            analysis_result['query_analysis'] = {
-                'patterns': [
-                    {
-                        'query_id': p.query_id,
-                        'type': p.query_type,
-                        'tables_used': list(p.tables_used),
-                        'joins': p.joins,
-                        'aggregations': p.aggregations,
-                        'group_by_columns': list(p.group_by_columns),  # НОВОЕ
-                        'filter_columns': list(p.filter_columns),  # НОВОЕ
-                        'cte_usage': p.cte_usage,
-                        'run_quantity': p.run_quantity,
-                        'execution_time': p.execution_time,
-                    }
-                    for p in query_patterns
-                ],
-                'statistics': query_stats
-            }
+        # 2-3. Анализ запросов (CPU) и сбор статистики БД (сетевой I/O) независимы,
+        # поэтому статистика собирается в отдельном потоке, пока анализируются запросы
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            db_stats_future = None
+            if 'url' in input_data:
+                logger.info("Collecting database statistics...")
+                table_names = [t['full_name'] for t in analysis_result['schema_analysis'].get('tables', [])]
+                db_stats_future = executor.submit(self._collect_database_stats, input_data['url'], table_names)
 
-        # 3. Сбор статистики БД
-        logger.info("Collecting database statistics...")
-        if 'url' in input_data:
-            try:
-                self.db_collector = DatabaseStatsCollector(input_data['url'])
-                if self.db_collector.connect():
-
-                    # Получаем список таблиц из DDL анализа
-                    table_names = []
-                    if 'schema_analysis' in analysis_result and 'tables' in analysis_result['schema_analysis']:
-                        table_names = [t['full_name'] for t in analysis_result['schema_analysis']['tables']]
-
-                    # Собираем статистику
-                    db_overview = self.db_collector.get_database_overview()
-                    table_stats = self.db_collector.collect_table_statistics(table_names)
-
-                    analysis_result['database_stats'] = {
-                        'overview': db_overview,
-                        'table_statistics': [
-                            {
-                                'table_name': ts.table_name,
-                                'row_count': ts.row_count,
-                                'size_bytes': ts.size_bytes,
-                                'column_stats': safe_json_serialize(ts.column_stats)
-                            }
-                            for ts in table_stats
-                        ]
-                    }
-
-                    self.db_collector.close()
-                else:
-                    analysis_result['database_stats'] = {'error': 'Failed to connect to database'}
+            logger.info("Analyzing SQL queries...")
+            if 'queries' in input_data:
+                analysis_result['query_analysis'] = self._analyze_queries(input_data['queries'])
 
-            except Exception as e:
-                logger.error(f"Database analysis failed: {e}")
-                analysis_result['database_stats'] = {'error': str(e)}
+            if db_stats_future is not None:
+                analysis_result['database_stats'] = db_stats_future.result()
 
         # 4. Подготовка данных для LLM
         analysis_result['recommendations_input'] = self._prepare_llm_input(analysis_result)
 
         logger.info("Analysis completed")
-        return safe_json_serialize(analysis_result)
+        # Приводим numpy/pandas типы к JSON-совместимым за один проход в C (orjson)
+        return orjson.loads(to_json_bytes(analysis_result))
+
+    def _analyze_ddl(self, ddl: list) -> Dict:
+        """Анализ DDL"""
+        tables = self.ddl_parser.parse_ddl_statements(ddl)
+        schema_stats = self.ddl_parser.get_table_stats(tables)
+
+        return {
+            'tables': [t.to_dict() for t in tables],
+            'statistics': schema_stats
+        }
+
+    def _analyze_queries(self, queries: list) -> Dict:
+        """Анализ запросов"""
+        query_patterns = self.query_analyzer.analyze_queries(queries)
+        query_stats = self.query_analyzer.get_query_statistics(query_patterns)
+
+        return {
+            'patterns': [p.to_dict() for p in query_patterns],
+            'statistics': query_stats
+        }
+
+    def _collect_database_stats(self, url: str, table_names: list) -> Dict:
+        """Сбор статистики БД"""
+        try:
+            self.db_collector = DatabaseStatsCollector(url)
+            if not self.db_collector.connect():
+                return {'error': 'Failed to connect to database'}
+
+            # Собираем статистику: обзор БД и статистика таблиц - независимые запросы,
+            # поэтому выполняем их параллельно
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                overview_future = executor.submit(self.db_collector.get_database_overview)
+                table_stats_future = executor.submit(self.db_collector.collect_table_statistics, table_names)
+                db_overview = overview_future.result()
+                table_stats = table_stats_future.result()
+
+            database_stats = {
+                'overview': db_overview,
+                'table_statistics': [
+                    {
+                        'table_name': ts.table_name,
+                        'row_count': ts.row_count,
+                        'size_bytes': ts.size_bytes,
+                        'column_stats': ts.column_stats
+                    }
+                    for ts in table_stats
+                ]
+            }
+
+            self.db_collector.close()
+            return database_stats
+
+        except Exception as e:
+            logger.error(f"Database analysis failed: {e}")
+            return {'error': str(e)}
 
     def _prepare_llm_input(self, analysis: Dict) -> Dict:
         """Подготавливает структурированные данные для LLM"""
@@ -1,11 +1,34 @@
 # app/crud.py
+from sqlalchemy import JSON, and_, bindparam, insert, or_, select, update
 from sqlalchemy.orm import Session
+from loguru import logger
 import datetime
 
 from src import models
 
 def get_task(db: Session, task_id: str):
-    return db.query(models.Task).filter(models.Task.id == task_id).first()
+    # Session.get checks the identity map before issuing a primary-key lookup
+    return db.get(models.Task, task_id)
+
+# Built once: the hot report endpoint only rebinds task_id, so the statements hit
+# the engine's compiled cache without being reconstructed per request
+_TASK_VERSION_STMT = select(models.Task.id, models.Task.completed_at).where(
+    models.Task.id == bindparam("task_id")
+)
+_TASK_REPORT_STMT = select(
+    models.Task.id,
+    models.Task.completed_at,
+    models.Task.db_analysis_report,
+    models.Task.db_analysis_viz,
+).where(models.Task.id == bindparam("task_id"))
+
+def get_task_version(db: Session, task_id: str):
+    """Return (id, completed_at) of a task, or None, without loading its JSON payloads."""
+    return db.execute(_TASK_VERSION_STMT, {"task_id": task_id}).one_or_none()
+
+def get_task_report(db: Session, task_id: str):
+    """Return only the columns the analysis report endpoint reads, or None."""
+    return db.execute(_TASK_REPORT_STMT, {"task_id": task_id}).one_or_none()
 
 def get_tasks(db: Session, skip: int = 0, limit: int = 50, status: str = None):
     query = db.query(models.Task)
@@ -13,11 +36,35 @@ def get_tasks(db: Session, skip: int = 0, limit: int = 50, status: str = None):
         query = query.filter(models.Task.status == status)
     return query.offset(skip).limit(limit).all()
 
-def get_tasks_with_newest_first(db: Session, skip: int = 0, limit: int = 50, status: str = None):
+def get_tasks_with_newest_first(db: Session, skip: int = 0, limit: int = 50, status: str = None,
+                                cursor: tuple = None):
+    """
+    List tasks newest first.
+
+    When `cursor` is given as the (submitted_at, id) of the last task of the previous page,
+    the page is fetched by keyset instead of OFFSET, so deep pages cost the same as the first.
+    """
     query = db.query(models.Task)
     if status:
         query = query.filter(models.Task.status == status)
-    return query.order_by(models.Task.submitted_at.desc()).offset(skip).limit(limit).all()
+    query = query.order_by(models.Task.submitted_at.desc(), models.Task.id.desc())
+    if cursor:
+        submitted_at, task_id = cursor
+        query = query.filter(or_(
+            models.Task.submitted_at < submitted_at,
+            and_(models.Task.submitted_at == submitted_at, models.Task.id < task_id)
+        ))
+    else:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+def encode_task_cursor(task: models.Task) -> str:
+    return f"{task.submitted_at.isoformat()}|{task.id}"
+
+def decode_task_cursor(cursor: str) -> tuple:
+    # The timestamp never contains '|', the task id might
+    submitted_at, task_id = cursor.split('|', 1)
+    return datetime.datetime.fromisoformat(submitted_at), task_id
 
 def create_task(db: Session, task_id: str, request_data: models.NewTaskRequest):
     db_task = models.Task(
@@ -30,33 +77,80 @@ def create_task(db: Session, task_id: str, request_data: models.NewTaskRequest):
     db.refresh(db_task)
     return db_task
 
+def _update_task(db: Session, task_id: str, **values):
+    """Write the given columns with a single UPDATE, without loading the row first."""
+    db.execute(update(models.Task).where(models.Task.id == task_id).values(**values))
+    db.commit()
+
 def update_task_status(db: Session, task_id: str, status: str, result: dict = None):
-    db_task = get_task(db, task_id)
-    if db_task:
-        db_task.status = status
-        db_task.completed_at = datetime.datetime.now(datetime.UTC)
-        if result:
-            db_task.result = result
-        db.commit()
+    values = {"status": status, "completed_at": datetime.datetime.now(datetime.UTC)}
+    if result:
+        values["result"] = result
+    _update_task(db, task_id, **values)
 
 def update_task_with_analysis(db: Session, task_id: str, report: dict):
-    db_task = get_task(db, task_id)
-    if db_task:
-        db_task.db_analysis_report = report
+    # Local import: analysis_report depends on this module
+    from src.analysis_report import build_analysis_viz, normalize_schema_overview
+
+    report = normalize_schema_overview(report)
+    # The report is immutable once saved, so project it for the dashboard only once
+    try:
+        viz = build_analysis_viz(report)
+    except Exception as e:
+        logger.warning(f"Could not precompute analysis visualization for task {task_id}: {e}")
+        # Marked as attempted so the startup backfill does not retry it; read falls back to projecting
+        viz = {}
+    _update_task(db, task_id, db_analysis_report=report, db_analysis_viz=viz)
+
+def backfill_analysis_viz(db: Session, batch_size: int = 100) -> int:
+    """
+    Precompute db_analysis_viz for tasks saved before it existed, normalizing their stored
+    report's schema_overview on the way. Tasks whose projection fails are marked with `{}`
+    so they are attempted only once.
+
+    Returns the number of tasks updated.
+    """
+    from src.analysis_report import build_analysis_viz, normalize_schema_overview
+
+    viz_column = models.Task.db_analysis_viz
+    task_ids = db.scalars(
+        select(models.Task.id).where(
+            models.Task.db_analysis_report.is_not(None),
+            # Older versions stored a failed projection as JSON null rather than SQL NULL
+            or_(viz_column.is_(None), viz_column == JSON.NULL)
+        )
+    ).all()
+
+    updated = 0
+    for start in range(0, len(task_ids), batch_size):
+        rows = db.execute(
+            select(models.Task.id, models.Task.db_analysis_report)
+            .where(models.Task.id.in_(task_ids[start:start + batch_size]))
+        ).all()
+        for task_id, report in rows:
+            try:
+                normalized = normalize_schema_overview(report)
+                viz = build_analysis_viz(normalized)
+            except Exception as e:
+                logger.warning(f"Could not backfill analysis visualization for task {task_id}: {e}")
+                values = {"db_analysis_viz": {}}
+            else:
+                values = {"db_analysis_viz": viz}
+                if normalized is not report:
+                    values["db_analysis_report"] = normalized
+            db.execute(update(models.Task).where(models.Task.id == task_id).values(**values))
+            updated += 1
         db.commit()
 
+    if updated:
+        logger.info(f"Backfilled analysis visualization for {updated} tasks")
+    return updated
+
 def update_task_after_step1(db: Session, task_id: str, ddl: str, migrations: str):
-    db_task = get_task(db, task_id)
-    if db_task:
-        db_task.optimized_ddl = ddl
-        db_task.migration_scripts = migrations
-        db.commit()
+    _update_task(db, task_id, optimized_ddl=ddl, migration_scripts=migrations)
 
 def update_task_after_step2(db: Session, task_id: str, queries: list):
-    db_task = get_task(db, task_id)
-    if db_task:
-        db_task.rewritten_queries = queries
-        db.commit()
+    _update_task(db, task_id, rewritten_queries=queries)
 
 def delete_task(db: Session, task_id: str):
     db_task = get_task(db, task_id)
@@ -66,10 +160,20 @@ def delete_task(db: Session, task_id: str):
         return True
     return False
 
-def create_log_entry(db: Session, task_id: str, level: str, message: str):
-    db_log = models.LogEntry(task_id=task_id, level=level, message=message)
-    db.add(db_log)
+def create_log_entries(db: Session, task_id: str, entries: list):
+    """Insert a batch of (timestamp, level, message) log entries with a single commit."""
+    if not entries:
+        return
+    db.execute(insert(models.LogEntry), [
+        {"task_id": task_id, "timestamp": timestamp, "level": level, "message": message}
+        for timestamp, level, message in entries
+    ])
     db.commit()
 
 def get_logs_for_task(db: Session, task_id: str):
-    return db.query(models.LogEntry).filter(models.LogEntry.task_id == task_id).all()
\ No newline at end of file
+    return (
+        db.query(models.LogEntry)
+        .filter(models.LogEntry.task_id == task_id)
+        .order_by(models.LogEntry.timestamp, models.LogEntry.id)
+        .all()
+    )
\ No newline at end of file
@@ -1,10 +1,48 @@
 # optimization_analyzer.py - ADD THESE FUNCTIONS
-from typing import Dict, List, Any, Tuple, Set
-from collections import defaultdict
+from typing import Dict, List, Any, NamedTuple, Optional, Tuple, Set
+from collections import Counter, defaultdict, OrderedDict
+from dataclasses import dataclass, field
+import hashlib
+import heapq
 import re
+import sys
+import threading
+
+import orjson
 
 from src.ddl_parser import DDLParser
 
+# Compiled once per process: referenced tables after FROM/JOIN, and identifier quotes
+_REF_RE = re.compile(r'\b(from|join)\s+([a-zA-Z0-9_\."]+)', re.IGNORECASE)
+_QUOTE_RE = re.compile(r'["`]')
+# One match per JOIN keyword; the group holds its type ('' for a plain JOIN)
+_JOIN_RE = re.compile(r'\b(?:(INNER|LEFT(?:\s+OUTER)?|RIGHT(?:\s+OUTER)?|FULL(?:\s+OUTER)?|CROSS)\s+)?JOIN\b', re.IGNORECASE)
+_PK_RE = re.compile(r'PRIMARY\s+KEY', re.IGNORECASE)
+# Join types reported in the denormalization join distribution
+_TRACKED_JOIN_TYPES = ('INNER', 'LEFT', 'RIGHT')
+
+# Common patterns for partitionable columns (matched as substrings of the lowercased name/type)
+_DATE_PATTERNS = ('date', 'time', 'year', 'month', 'quarter', 'day', 'timestamp',
+                  'created', 'updated', 'modified')
+_DATE_TYPES = ('date', 'time', 'timestamp')
+_CATEGORY_PATTERNS = ('type', 'category', 'status', 'region', 'country', 'state')
+# Each keyword group as one alternation, so a name is scanned once instead of once per keyword
+_DATE_NAME_RE = re.compile('|'.join(map(re.escape, _DATE_PATTERNS)))
+_DATE_TYPE_RE = re.compile('|'.join(map(re.escape, _DATE_TYPES)))
+_CATEGORY_NAME_RE = re.compile('|'.join(map(re.escape, _CATEGORY_PATTERNS)))
+
+
+# Reports of recently seen inputs, keyed by a content hash of the DDL and queries
+INSIGHTS_CACHE_SIZE = 32
+_insights_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_insights_cache_lock = threading.Lock()
+
+
+def _normalize_identifier(s: str) -> str:
+    """Strip identifier quotes and lowercase a (possibly dotted) table reference."""
+    return _QUOTE_RE.sub('', s).strip().lower()
+
+
 def create_insights_report(ddl_statements: List[Dict], queries: List[Dict]) -> Dict[str, Any]:
     """
     Create comprehensive schema insights report from DDL and queries.
@@ -16,11 +54,44 @@ def create_insights_report(ddl_statements: List[Dict], queries: List[Dict]) -> D
 
     Returns:
         Dict containing detailed schema insights for visualization
+
+    The report is a pure function of its inputs, so reports of recently seen inputs
+    are memoized and every hit returns the same shared dict, which callers must not mutate.
+    The report's `etag` is the content hash of the inputs (see `insights_etag`), usable
+    for HTTP revalidation.
     """
+    try:
+        etag = insights_etag(ddl_statements, queries)
+    except TypeError:
+        # Not JSON-serializable input; just build the report
+        return _build_insights_report(ddl_statements, queries)
+
+    with _insights_cache_lock:
+        report = _insights_cache.get(etag)
+        if report is not None:
+            _insights_cache.move_to_end(etag)
+    if report is None:
+        report = {"etag": etag, **_build_insights_report(ddl_statements, queries)}
+        with _insights_cache_lock:
+            _insights_cache[etag] = report
+            if len(_insights_cache) > INSIGHTS_CACHE_SIZE:
+                _insights_cache.popitem(last=False)
+    return report
+
+
+def insights_etag(ddl_statements: List[Dict], queries: List[Dict]) -> str:
+    """Content hash of the insights report inputs, independent of dict key order."""
+    payload = orjson.dumps({"ddl": ddl_statements, "queries": queries}, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def _build_insights_report(ddl_statements: List[Dict], queries: List[Dict]) -> Dict[str, Any]:
+    """Build the insights report; see `create_insights_report`."""
     parser = DDLParser()
 
-    # Parse tables from DDL
-    tables = parser.parse_ddl_statements(ddl_statements)
+    # Parse tables from DDL, reducing the schema-only metrics as each table is parsed
+    schema_scan = _scan_schema(parser, ddl_statements)
+    tables = schema_scan.tables
 
     if not tables:
         return {
@@ -47,9 +118,10 @@ def create_insights_report(ddl_statements: List[Dict], queries: List[Dict]) -> D
     # Get column type distribution
     stats = parser.get_table_stats(tables)
 
-    # Enhance with additional analysis
-    data_quality = _analyze_data_quality(tables, queries)
-    query_coverage = _analyze_query_coverage(tables, queries)
+    # Enhance with additional analysis; all query-derived metrics come from one pass over the queries
+    query_scan = _scan_queries(_normalize_queries(queries), schema_scan.known_keys, schema_scan.known_canons)
+    data_quality = _analyze_data_quality(schema_scan, query_scan)
+    query_coverage = _analyze_query_coverage(tables, queries, schema_scan.known_canons, query_scan)
 
     return {
         "total_columns": schema_insights["total_columns"],
@@ -59,14 +131,162 @@ def create_insights_report(ddl_statements: List[Dict], queries: List[Dict]) -> D
         "index_coverage": schema_insights["index_coverage"],
         "data_quality": data_quality,
         "query_coverage": query_coverage,
-        "partitioning_candidates": _identify_partitioning_candidates(tables),
-        "denormalization_opportunities": _identify_denormalization_opportunities(tables, queries),
+        "partitioning_candidates": schema_scan.partitioning_candidates,
+        "denormalization_opportunities": _identify_denormalization_opportunities(tables, query_scan),
         "statistics": stats
     }
 
 
-def _analyze_data_quality(tables: List, queries: List[Dict]) -> Dict[str, Any]:
+@dataclass(slots=True)
+class _QueryScan:
+    """Query-derived metrics collected in a single pass by `_scan_queries`."""
+    referenced_tables: Set[str] = field(default_factory=set)  # last dotted part of FROM/JOIN references
+    table_usage: Dict[str, int] = field(default_factory=dict)  # table -> executions referencing it
+    total_joins: int = 0
+    complex_joins: int = 0
+    join_patterns: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+
+@dataclass(slots=True)
+class _SchemaScan:
+    """Schema-derived metrics accumulated table by table by `_scan_schema`."""
+    tables: List = field(default_factory=list)
+    total_columns: int = 0
+    nullable_columns: int = 0
+    tables_without_pk: int = 0
+    known_keys: Dict[str, str] = field(default_factory=dict)  # name a query may use -> canonical name
+    known_canons: Dict[str, None] = field(default_factory=dict)  # insertion-ordered set of canonical names
+    partitioning_candidates: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def _scan_schema(parser: DDLParser, ddl_statements: List[Dict]) -> _SchemaScan:
+    """Parse the DDL table by table, folding every schema-only reduction into the same pass."""
+    scan = _SchemaScan()
+    for table in parser.iter_tables(ddl_statements):
+        # The parsed tables are still needed by the DDLParser statistics
+        scan.tables.append(table)
+
+        columns = table.columns
+        scan.total_columns += len(columns)
+        # Column.nullable is a bool, so a materialized list hits sum()'s int fast path
+        scan.nullable_columns += sum([c.nullable for c in columns])
+        # Check for primary keys (generic approach)
+        if not _has_primary_key(table):
+            scan.tables_without_pk += 1
+
+        _index_known_table(table, scan.known_keys, scan.known_canons)
+
+        candidates = _table_partitioning_candidates(table)
+        if candidates:
+            scan.partitioning_candidates.append(candidates)
+    return scan
+
+
+def _index_known_table(t, known_keys: Dict[str, str], known_canons: Dict[str, None]) -> None:
+    """
+    Map every name a query may use for a DDL table (table, schema.table, db.schema.table)
+    to its canonical name, and record the canonical name.
+    """
+    normalize = _normalize_identifier
+
+    t_name = normalize(getattr(t, 'name', '') or '')
+    t_schema = normalize(getattr(t, 'schema', '') or '')
+    # Canonical name; interned (as are the keys) so the index, the usage map and the
+    # names looked up by the query scan share one string object per name
+    intern = sys.intern
+    canon = intern(f"{t_schema}.{t_name}" if t_schema else t_name)
+    # Fill index keys for matching
+    if t_name:
+        known_keys[intern(t_name)] = canon
+        known_canons[canon] = None
+    if t_schema and t_name:
+        known_keys[canon] = canon  # schema.table is the canonical name itself
+    # Support db.schema.table if available
+    db = normalize(getattr(t, 'database', '') or '')
+    if db and t_schema and t_name:
+        known_keys[intern(f"{db}.{canon}")] = canon
+
+
+class _Query(NamedTuple):
+    """Query text and run quantity, extracted and coerced once per report."""
+    text: str
+    runq: int
+
+
+def _normalize_queries(queries: List[Dict]) -> List[_Query]:
+    """Extract the fields the query scan needs, skipping queries without text."""
+    normalized = []
+    for q in queries:
+        text = q.get('query') or ''
+        if text:
+            normalized.append(_Query(text, int(q.get('runquantity', 0) or 0)))
+    return normalized
+
+
+def _scan_queries(queries: List[_Query], known_keys: Dict[str, str], known_canons: Dict[str, None]) -> _QueryScan:
+    """
+    Walk the queries once, collecting the referenced tables (orphan detection), the
+    per-table usage weighted by run quantity (query coverage) and the join counters
+    (denormalization opportunities).
+    """
+    scan = _QueryScan(table_usage=dict.fromkeys(known_canons, 0))
+    usage = scan.table_usage
+    referenced = scan.referenced_tables
+    join_patterns = scan.join_patterns
+
+    for text, runq in queries:
+        # Count different join types in a single regex scan
+        join_types = _JOIN_RE.findall(text)
+        join_count = len(join_types)
+        scan.total_joins += join_count * runq
+
+        if join_count > 3:
+            scan.complex_joins += runq
+
+        # Track specific join patterns (once per query, weighted by its executions)
+        used_types = {join_type.split(None, 1)[0].upper() for join_type in join_types if join_type}
+        for join_type in _TRACKED_JOIN_TYPES:
+            if join_type in used_types:
+                join_patterns[join_type] += runq
+
+        # Table keys referenced by this query, aggregated before touching usage
+        ref_keys = []
+        for _, ref in _REF_RE.findall(text):
+            ref_norm = _normalize_identifier(ref)
+            if '.' not in ref_norm:
+                # Fast path: most references are bare table names
+                if ref_norm:
+                    referenced.add(ref_norm)
+                    ref_keys.append(known_keys.get(ref_norm) or ref_norm)
+                continue
+
+            parts = [p for p in ref_norm.split('.') if p]
+            if not parts:
+                continue
+            table = parts[-1]
+            referenced.add(table)
+
+            # Match table, then schema.table, then db.schema.table; referenced-but-unknown
+            # tables are still shown, keyed by their most specific short form
+            canon = known_keys.get(table)
+            key = canon or table
+            if canon is None and len(parts) >= 2:
+                schema_table = f"{parts[-2]}.{table}"
+                canon = known_keys.get(schema_table)
+                if canon is None and len(parts) >= 3:
+                    canon = known_keys.get(f"{parts[-3]}.{schema_table}")
+                key = canon or schema_table
+            ref_keys.append(key)
+
+        for key, count in Counter(ref_keys).items():
+            usage[key] = usage.get(key, 0) + count * runq
+
+    return scan
+
+
+def _analyze_data_quality(schema_scan: _SchemaScan, query_scan: _QueryScan) -> Dict[str, Any]:
     """Analyze data quality metrics from schema."""
+    tables = schema_scan.tables
     if not tables:
         return {
             "nullable_columns_percent": 0,
@@ -75,20 +295,13 @@ def _analyze_data_quality(tables: List, queries: List[Dict]) -> Dict[str, Any]:
             "recommendations": []
         }
 
-    total_columns = sum(len(t.columns) for t in tables)
-    nullable_columns = sum(1 for t in tables for c in t.columns if c.nullable)
-
-    # Check for primary keys (generic approach)
-    tables_without_pk = sum(1 for t in tables if not _has_primary_key(t))
+    total_columns = schema_scan.total_columns
+    nullable_columns = schema_scan.nullable_columns
+    tables_without_pk = schema_scan.tables_without_pk
 
-    # Check for orphaned tables (not referenced in queries)
-    orphaned_tables = 0
-    query_text = ' '.join(q.get('query', '').lower() for q in queries)
-    for table in tables:
-        table_name = table.name.lower()
-        # Check if table appears in queries
-        if table_name not in query_text:
-            orphaned_tables += 1
+    # Check for orphaned tables (not referenced after FROM/JOIN in any query)
+    referenced = query_scan.referenced_tables
+    orphaned_tables = sum([t.name.lower() not in referenced for t in tables])
 
     # Generate recommendations
     recommendations = []
@@ -113,36 +326,34 @@ def _analyze_data_quality(tables: List, queries: List[Dict]) -> Dict[str, Any]:
 
 def _has_primary_key(table) -> bool:
     """Check if table has a primary key - handles None values safely"""
-    # Check if any column is marked as primary key
-    if hasattr(table, 'columns') and table.columns:
-        for col in table.columns:
-            # Check column's primary_key attribute
-            if hasattr(col, 'primary_key') and col.primary_key:
-                return True
-
-            # Check column constraints (safely)
-            if hasattr(col, 'constraints') and col.constraints is not None:
-                try:
-                    for constraint in col.constraints:
-                        if constraint and 'PRIMARY KEY' in str(constraint).upper():
-                            return True
-                except (TypeError, AttributeError):
-                    pass
-
-    # Check table-level constraints (safely)
-    if hasattr(table, 'constraints') and table.constraints is not None:
-        try:
-            for constraint in table.constraints:
-                if constraint and 'PRIMARY KEY' in str(constraint).upper():
-                    return True
-        except (TypeError, AttributeError):
-            pass
-
-    return False
-
-
-def _analyze_query_coverage(tables: List, queries: List[Dict]) -> Dict[str, Any]:
-    """Analyze which tables are used in queries and how frequently (schema-aware)."""
+    for col in getattr(table, 'columns', None) or ():
+        # Column's primary_key attribute, then its constraints
+        if getattr(col, 'primary_key', False) or _has_pk_constraint(getattr(col, 'constraints', None)):
+            return True
+
+    # Table-level constraints
+    return _has_pk_constraint(getattr(table, 'constraints', None))
+
+
+def _has_pk_constraint(constraints) -> bool:
+    """Check whether any of the given constraints declares a PRIMARY KEY."""
+    if not constraints:
+        return False
+    try:
+        return any(constraint and _PK_RE.search(str(constraint)) for constraint in constraints)
+    except TypeError:
+        return False
+
+
+def _analyze_query_coverage(tables: List, queries: List[Dict], known_canons: Dict[str, None],
+                            query_scan: _QueryScan, top_k: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Analyze which tables are used in queries and how frequently (schema-aware).
+
+    By default `table_usage` keeps every table, as the dashboard lists and counts them all.
+    With `top_k` it only holds the `top_k` most used tables, selected without sorting
+    the whole usage map.
+    """
     if not queries:
         # If no queries, return structured empty response
         tbl_names = [t.name for t in tables] if tables else []
@@ -153,79 +364,22 @@ def _analyze_query_coverage(tables: List, queries: List[Dict]) -> Dict[str, Any]
             "most_queried_count": 0
         }
 
-    # Build a normalized index of known tables from DDL
-    def normalize(s: str) -> str:
-        return re.sub(r'["`]', '', s).strip().lower()
-
-    known_keys = {}  # key -> canonical_name
-    for t in (tables or []):
-        t_name = normalize(getattr(t, 'name', '') or '')
-        t_schema = normalize(getattr(t, 'schema', '') or '')
-        # Canonical name
-        canon = f"{t_schema}.{t_name}" if t_schema else t_name
-        # Fill index keys for matching
-        if t_name:
-            known_keys[t_name] = canon
-        if t_schema and t_name:
-            known_keys[f"{t_schema}.{t_name}"] = canon
-        # Support db.schema.table if available
-        db = normalize(getattr(t, 'database', '') or '')
-        if db and t_schema and t_name:
-            known_keys[f"{db}.{t_schema}.{t_name}"] = canon
-
-    # Initialize usage with known tables
-    usage = {canon: 0 for canon in set(known_keys.values())}
-
-    # Regex to extract referenced tables after FROM/JOIN
-    ref_re = re.compile(r'\b(from|join)\s+([a-zA-Z0-9_\."]+)', re.IGNORECASE)
-
-    def all_forms(ref: str) -> List[str]:
-        """Return possible matching keys"""
-        ref_norm = normalize(ref)
-        parts = [p for p in ref_norm.split('.') if p]
-        forms = []
-        if parts:
-            forms.append(parts[-1])  # table
-        if len(parts) >= 2:
-            forms.append('.'.join(parts[-2:]))  # schema.table
-        if len(parts) >= 3:
-            forms.append('.'.join(parts[-3:]))  # db.schema.table
-        return list(dict.fromkeys(forms))
-
-    for q in queries:
-        text = (q.get('query') or '')
-        runq = int(q.get('runquantity', 0) or 0)
-        if not text:
-            continue
-
-        for _, ref in ref_re.findall(text):
-            matched = False
-            for form in all_forms(ref):
-                if form in known_keys:
-                    usage[known_keys[form]] += runq
-                    matched = True
-                    break
-
-            # If not matched and we want to show referenced-but-unknown tables
-            if not matched:
-                forms = all_forms(ref)
-                key = forms[1] if len(forms) >= 2 else forms[0] if forms else None
-                if key:
-                    usage.setdefault(key, 0)
-                    usage[key] += runq
+    usage = query_scan.table_usage
 
     # Compute unused among known tables
-    known_canons = set(known_keys.values())
     unused_tables = [k for k in known_canons if usage.get(k, 0) == 0]
 
-    # Identify most queried
+    # Sort usage descending (both are stable, so ties keep first-seen order)
+    if top_k is not None:
+        usage_sorted = dict(heapq.nlargest(top_k, usage.items(), key=lambda x: x[1]))
+    else:
+        usage_sorted = dict(sorted(usage.items(), key=lambda x: x[1], reverse=True))
+
+    # Identify most queried: the head of the (top-K) sorted usage, without another max() pass
     most_queried_table = None
     most_queried_count = 0
-    if usage:
-        most_queried_table, most_queried_count = max(usage.items(), key=lambda x: x[1])
-
-    # Sort usage descending
-    usage_sorted = {k: v for k, v in sorted(usage.items(), key=lambda x: x[1], reverse=True)}
+    if usage_sorted:
+        most_queried_table, most_queried_count = next(iter(usage_sorted.items()))
 
     return {
         "table_usage": usage_sorted,
@@ -235,52 +389,45 @@ def _analyze_query_coverage(tables: List, queries: List[Dict]) -> Dict[str, Any]
     }
 
 
-def _identify_partitioning_candidates(tables: List) -> List[Dict[str, Any]]:
-    """Identify columns suitable for partitioning - GENERIC"""
-    candidates = []
-
-    # Common patterns for partitionable columns
-    date_patterns = ['date', 'time', 'year', 'month', 'quarter', 'day', 'timestamp',
-                     'created', 'updated', 'modified']
-    category_patterns = ['type', 'category', 'status', 'region', 'country', 'state']
-
-    for table in tables:
-        table_candidates = []
-
-        for column in table.columns:
-            col_name_lower = column.name.lower()
-            col_type_lower = column.data_type.lower() if hasattr(column, 'data_type') else ''
-
-            # Check for date/time columns
-            if any(pattern in col_name_lower for pattern in date_patterns) or \
-                    any(dt in col_type_lower for dt in ['date', 'time', 'timestamp']):
-                table_candidates.append({
-                    "column": column.name,
-                    "type": getattr(column, 'data_type', 'unknown'),
-                    "reason": "Temporal column suitable for time-based partitioning",
-                    "strategy": "RANGE partitioning by date/time"
-                })
-
-            # Check for categorical columns with low cardinality
-            elif any(pattern in col_name_lower for pattern in category_patterns):
-                table_candidates.append({
-                    "column": column.name,
-                    "type": getattr(column, 'data_type', 'unknown'),
-                    "reason": "Categorical column suitable for list partitioning",
-                    "strategy": "LIST partitioning by category"
-                })
-
-        if table_candidates:
-            table_name = f"{table.schema}.{table.name}" if hasattr(table, 'schema') and table.schema else table.name
-            candidates.append({
-                "table": table_name,
-                "candidates": table_candidates
+def _table_partitioning_candidates(table) -> Optional[Dict[str, Any]]:
+    """Identify columns of a table suitable for partitioning - GENERIC"""
+    table_candidates = []
+
+    for column in table.columns:
+        col_name_lower = column.name.lower()
+        col_type = getattr(column, 'data_type', 'unknown')
+        col_type_lower = col_type.lower() if col_type else ''
+
+        # Check for date/time columns
+        if _DATE_NAME_RE.search(col_name_lower) or _DATE_TYPE_RE.search(col_type_lower):
+            table_candidates.append({
+                "column": column.name,
+                "type": col_type,
+                "reason": "Temporal column suitable for time-based partitioning",
+                "strategy": "RANGE partitioning by date/time"
+            })
+
+        # Check for categorical columns with low cardinality
+        elif _CATEGORY_NAME_RE.search(col_name_lower):
+            table_candidates.append({
+                "column": column.name,
+                "type": col_type,
+                "reason": "Categorical column suitable for list partitioning",
+                "strategy": "LIST partitioning by category"
             })
 
-    return candidates
+    if not table_candidates:
+        return None
 
+    schema = getattr(table, 'schema', None)
+    table_name = f"{schema}.{table.name}" if schema else table.name
+    return {
+        "table": table_name,
+        "candidates": table_candidates
+    }
 
-def _identify_denormalization_opportunities(tables: List, queries: List[Dict]) -> Dict[str, Any]:
+
+def _identify_denormalization_opportunities(tables: List, query_scan: _QueryScan) -> Dict[str, Any]:
     """Identify opportunities for denormalization based on query patterns - GENERIC"""
     if len(tables) <= 1:
         return {
@@ -289,29 +436,9 @@ def _identify_denormalization_opportunities(tables: List, queries: List[Dict]) -
             "recommendations": []
         }
 
-    # Count joins in queries
-    total_joins = 0
-    complex_joins = 0
-    join_patterns = defaultdict(int)
-
-    for query in queries:
-        query_text = query.get('query', '').upper()
-        run_qty = query.get('runquantity', 0)
-
-        # Count different join types
-        join_count = query_text.count('JOIN')
-        total_joins += join_count * run_qty
-
-        if join_count > 3:
-            complex_joins += run_qty
-
-        # Track specific join patterns
-        if 'INNER JOIN' in query_text:
-            join_patterns['INNER'] += run_qty
-        if 'LEFT JOIN' in query_text or 'LEFT OUTER JOIN' in query_text:
-            join_patterns['LEFT'] += run_qty
-        if 'RIGHT JOIN' in query_text or 'RIGHT OUTER JOIN' in query_text:
-            join_patterns['RIGHT'] += run_qty
+    total_joins = query_scan.total_joins
+    complex_joins = query_scan.complex_joins
+    join_patterns = query_scan.join_patterns
 
     recommendations = []
     opportunity_level = "low"
@@ -1,15 +1,25 @@
 # db_stats_collector.py
+import re
+import sys
+import time
 import urllib.parse
-import json
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass, replace
+from functools import lru_cache
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine, text
+import orjson
+from sqlalchemy import bindparam, create_engine, text
 from loguru import logger
 
+from src.ddl_parser import split_table_name
 
-@dataclass
+
+@dataclass(slots=True)
 class TableStatistics:
     table_name: str
     row_count: int
@@ -20,7 +30,7 @@ class TableStatistics:
     partitioning_columns: Optional[List[str]] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class ConnectionInfo:
     driver: str
     host: str
@@ -31,69 +41,238 @@ class ConnectionInfo:
     additional_params: Dict[str, str]
 
 
+def _float_or_none(value) -> Optional[float]:
+    value = float(value)
+    return None if value != value else value  # NaN -> None
+
+
+# Конвертеры по точному типу: один поиск в dict вместо цепочки isinstance
+_CONVERTERS = {
+    np.int64: int,
+    np.int32: int,
+    np.int16: int,
+    np.int8: int,
+    np.uint64: int,
+    np.uint32: int,
+    np.bool_: bool,
+    np.float64: _float_or_none,
+    np.float32: _float_or_none,
+    np.ndarray: np.ndarray.tolist,
+    pd.Timestamp: pd.Timestamp.isoformat,
+}
+
+
 def convert_numpy_types(obj):
     """Конвертирует numpy/pandas типы в обычные Python типы для JSON сериализации"""
-    if isinstance(obj, (np.integer, pd.Int64Dtype)):
+    converter = _CONVERTERS.get(type(obj))
+    if converter is not None:
+        return converter(obj)
+    # Остальные numpy-скаляры, которых нет в таблице
+    if isinstance(obj, np.integer):
         return int(obj)
-    elif isinstance(obj, (np.floating, pd.Float64Dtype)):
-        return float(obj)
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
-    elif isinstance(obj, (pd.Timestamp, pd.DatetimeTZDtype)):
-        return obj.isoformat()
-    elif pd.isna(obj):
+    if isinstance(obj, np.floating):
+        return _float_or_none(obj)
+    # Пропуски pandas/float проверяем напрямую, без pd.isna и его разбора типа аргумента
+    if obj is None or obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, float):
+        return _float_or_none(obj)
+    if isinstance(obj, np.datetime64) and np.isnat(obj):
         return None
     return obj
 
 
-def safe_json_serialize(data: Any) -> Dict:
-    """Безопасно сериализует данные, конвертируя numpy/pandas типы"""
-    if isinstance(data, dict):
-        return {k: safe_json_serialize(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [safe_json_serialize(item) for item in data]
-    else:
-        return convert_numpy_types(data)
+def json_default(obj):
+    """Fallback для orjson: типы, которые он не сериализует сам (Decimal, pandas и т.п.)"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    converted = convert_numpy_types(obj)
+    if converted is obj:
+        raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+    return converted
+
+
+def to_json_bytes(data, option: int = 0) -> bytes:
+    """Сериализует данные в JSON (orjson) с поддержкой numpy/pandas/Decimal"""
+    return orjson.dumps(
+        data,
+        default=json_default,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | option
+    )
+
+
+# jdbc:<driver>://[user[:password]@]host[:port][/path][?query]; userinfo берется до последнего '@'
+# перед путем, поэтому '@' и ':' в пароле не ломают разбор, а '#' в query не считается фрагментом
+_JDBC_URL_RE = re.compile(
+    r'^jdbc:(?P<driver>[^:/]+)://'
+    r'(?:(?P<userinfo>[^/?]*)@)?'
+    r'(?P<host>\[[^\]]+\]|[^:/?]+)'
+    r'(?::(?P<port>\d+))?'
+    r'(?P<path>/[^?]*)?'
+    r'(?:\?(?P<query>.*))?$',
+    re.DOTALL
+)
+
+
+@lru_cache(maxsize=64)
+def _parse_jdbc_url(url: str) -> ConnectionInfo:
+    """Парсит JDBC URL"""
+    match = _JDBC_URL_RE.match(url)
+    if not match:
+        raise ValueError("Invalid JDBC URL format")
+
+    driver = match['driver']
+
+    # Извлекаем параметры
+    params = urllib.parse.parse_qs(match['query'] or '')
+
+    # Учетные данные из query имеют приоритет над user:password@ в адресе
+    user_part, _, password_part = (match['userinfo'] or '').partition(':')
+    username = params.get('user', [urllib.parse.unquote(user_part)])[0]
+    password = params.get('password', [urllib.parse.unquote(password_part)])[0]
+
+    # Для Trino: если база не указана, используем пустую строку (не 'default'!)
+    path = match['path']
+    database = path.lstrip('/') if path and path != '/' else ''
+
+    return ConnectionInfo(
+        driver=driver,
+        host=match['host'].strip('[]').lower(),
+        port=int(match['port']) if match['port'] else (443 if driver == 'trino' else 5432),
+        database=database,
+        username=username,
+        password=password,
+        additional_params={k: v[0] for k, v in params.items()
+                           if k not in ['user', 'password']}
+    )
+
+
+# Имена, которые можно подставлять в SQL как есть: обычные и корректно взятые в кавычки
+_SAFE_IDENTIFIER_RE = re.compile(r'^(?:[A-Za-z_][A-Za-z0-9_]*|"(?:[^"]|"")+")$')
+
+
+def _quote_identifier(name: str) -> str:
+    """
+    Экранирует идентификатор для подстановки в SQL. Обычные имена и уже взятые в кавычки
+    остаются как есть, чтобы не менять правила регистра; остальные берутся в двойные кавычки.
+    """
+    if not name or _SAFE_IDENTIFIER_RE.match(name):
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _quote_table_name(table_name: str) -> str:
+    """Экранирует каждую часть имени catalog.schema.table"""
+    return '.'.join(_quote_identifier(part) for part in table_name.split('.'))
+
+
+# Метаданные кластера (каталоги, колонки таблиц) меняются редко и кешируются в процессе
+# между запусками сбора статистики; сбрасываются через refresh_metadata()
+METADATA_CACHE_SIZE = 256
+_metadata_lock = threading.Lock()
+_catalogs_cache: Dict[tuple, List[str]] = {}
+_overview_cache: Dict[tuple, Dict] = {}
+_columns_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+# Собранная статистика таблиц: повторный анализ (ретрай задачи, тот же DDL) не сканирует
+# таблицы заново. Ключ включает список колонок, так что изменение схемы дает промах,
+# а TTL ограничивает устаревание самих данных
+STATS_CACHE_SIZE = 512
+STATS_CACHE_TTL_SECONDS = 3600
+_stats_cache: "OrderedDict[tuple, Tuple[float, TableStatistics]]" = OrderedDict()
+
+# Пул соединений рассчитан на параллельный сбор статистики по таблицам
+DEFAULT_POOL_SIZE = 8
+POOL_MAX_OVERFLOW = 4
+POOL_RECYCLE_SECONDS = 1800
+# LRU скомпилированных запросов: помимо постоянных, на каждую таблицу приходятся свои
+# COUNT(*)/SHOW STATS/агрегаты, и стандартные 500 записей быстро вытесняются
+QUERY_CACHE_SIZE = 1200
+# Базовые типы Trino, для которых собирается числовая статистика
+_NUMERIC_TYPES = frozenset({'tinyint', 'smallint', 'integer', 'bigint', 'double', 'real', 'decimal', 'float'})
+# Примерная ширина значения базового типа Trino в байтах, для оценки размера таблицы
+_TYPE_WIDTHS = {
+    'boolean': 1, 'tinyint': 1, 'smallint': 2, 'integer': 4, 'int': 4, 'bigint': 8,
+    'real': 4, 'float': 4, 'double': 8, 'decimal': 8,
+    'date': 4, 'time': 8, 'timestamp': 8, 'interval': 8, 'uuid': 16, 'ipaddress': 16,
+    'varchar': 32, 'char': 32, 'varbinary': 32, 'json': 64,
+    'array': 64, 'map': 64, 'row': 64,
+}
+# Ширина для типов, которых нет в _TYPE_WIDTHS
+DEFAULT_TYPE_WIDTH = 16
+# Байт на строку, если типы колонок неизвестны
+DEFAULT_ROW_WIDTH = 200
+# Таблицы Trino больше SAMPLE_ROW_THRESHOLD строк (по SHOW STATS) сканируются для статистики
+# колонок по выборке TABLESAMPLE BERNOULLI из SAMPLE_PERCENT процентов строк
+SAMPLE_ROW_THRESHOLD = 10_000_000
+SAMPLE_PERCENT = 1
+# Колонок в одном агрегирующем запросе, чтобы не упираться в лимиты планировщика Trino
+COLUMN_STATS_CHUNK_SIZE = 50
+
+
+def _base_type(data_type: str) -> str:
+    """Базовый тип без параметров: DECIMAL(10,2) -> decimal, timestamp(3) with time zone -> timestamp"""
+    return data_type.strip().split('(', 1)[0].split(' ', 1)[0].lower()
 
 
 class DatabaseStatsCollector:
-    def __init__(self, connection_url: str):
+    # Неизменные запросы собираются один раз; имена передаются параметрами
+    _STMT_PING = text("SELECT 1")
+    _STMT_CATALOGS = text("SHOW CATALOGS")
+    _STMT_VERSION = text("SELECT version()")
+    _STMT_COLUMNS = text("""
+        SELECT column_name, data_type, is_nullable
+        FROM information_schema.columns 
+        WHERE table_catalog = :cat 
+        AND table_schema = :sch 
+        AND table_name = :tbl
+        ORDER BY ordinal_position
+    """)
+    _STMT_COLUMNS_BULK = text("""
+        SELECT table_name, column_name, data_type, is_nullable
+        FROM information_schema.columns 
+        WHERE table_catalog = :cat 
+        AND table_schema = :sch 
+        AND table_name IN :tbls
+        ORDER BY table_name, ordinal_position
+    """).bindparams(bindparam("tbls", expanding=True))
+    _STMT_SCHEMAS = text("""
+        SELECT schema_name 
+        FROM information_schema.schemata 
+        WHERE catalog_name = :cat
+    """)
+    _STMT_TABLES = text("""
+        SELECT COUNT(*) as table_count
+        FROM information_schema.tables 
+        WHERE table_catalog = :cat
+    """)
+    _STMT_TABLES_SAMPLE = text("""
+        SELECT table_schema, table_name 
+        FROM information_schema.tables 
+        WHERE table_catalog = :cat
+        LIMIT 5
+    """)
+
+    def __init__(self, connection_url: str, pool_size: int = DEFAULT_POOL_SIZE, exact_distinct: bool = False):
+        """
+        По умолчанию distinct_count считается через approx_distinct (HyperLogLog, стандартная
+        ошибка ~2.3%) — без shuffle всех значений, как у COUNT(DISTINCT). Точный подсчет
+        включается через exact_distinct=True; для драйверов кроме Trino он используется всегда.
+        """
         self.connection_info = self._parse_connection_url(connection_url)
+        self.pool_size = pool_size
+        self.exact_distinct = exact_distinct
         self.engine = None
         self.sqlalchemy_url = self._build_sqlalchemy_url()
         self.actual_catalog = None  # Будет определен при подключении
 
     def _parse_connection_url(self, url: str) -> ConnectionInfo:
         """Парсит JDBC URL"""
-        if not url.startswith('jdbc:'):
-            raise ValueError("Invalid JDBC URL format")
-
-        # Убираем jdbc: префикс
-        url = url[5:]
-
-        # Определяем драйвер
-        driver_match = url.split('://')[0]
-        driver = driver_match
-
-        # Парсим остальную часть URL
-        parsed = urllib.parse.urlparse(url)
-
-        # Извлекаем параметры
-        params = urllib.parse.parse_qs(parsed.query)
-
-        # Для Trino: если база не указана, используем пустую строку (не 'default'!)
-        database = parsed.path.lstrip('/') if parsed.path and parsed.path != '/' else ''
-
-        return ConnectionInfo(
-            driver=driver,
-            host=parsed.hostname,
-            port=parsed.port or (443 if driver == 'trino' else 5432),
-            database=database,
-            username=params.get('user', [''])[0],
-            password=params.get('password', [''])[0],
-            additional_params={k: v[0] for k, v in params.items()
-                               if k not in ['user', 'password']}
-        )
+        # Разбор кешируется, а каждому коллектору отдается своя копия
+        info = _parse_jdbc_url(url)
+        return replace(info, additional_params=dict(info.additional_params))
 
     def _build_sqlalchemy_url(self) -> str:
         """Строит URL для SQLAlchemy"""
@@ -120,13 +299,12 @@ class DatabaseStatsCollector:
         """Определяет доступный каталог в Trino"""
         try:
             # Получаем список всех каталогов
-            catalogs_df = pd.read_sql("SHOW CATALOGS", conn)
+            catalogs = self._fetch_catalogs(conn)
 
-            if catalogs_df.empty:
+            if not catalogs:
                 logger.warning("No catalogs found in Trino")
                 return None
 
-            catalogs = catalogs_df.iloc[:, 0].tolist()
             logger.info(f"Available catalogs: {catalogs}")
 
             # Приоритет выбора каталога:
@@ -151,14 +329,152 @@ class DatabaseStatsCollector:
             logger.error(f"Error detecting catalog: {e}")
             return None
 
+    @property
+    def _server_key(self) -> tuple:
+        """Ключ кластера в кешах метаданных"""
+        return self.connection_info.host, self.connection_info.port, self.connection_info.username
+
+    def _fetch_catalogs(self, conn) -> List[str]:
+        """Список каталогов кластера (SHOW CATALOGS), закешированный по серверу"""
+        key = self._server_key
+        with _metadata_lock:
+            catalogs = _catalogs_cache.get(key)
+        if catalogs is None:
+            catalogs = conn.execute(self._STMT_CATALOGS).scalars().all()
+            if catalogs:
+                with _metadata_lock:
+                    _catalogs_cache[key] = catalogs
+        return catalogs
+
+    def _fetch_columns(self, conn, catalog: str, schema: str, table: str) -> tuple:
+        """Колонки таблицы ((column_name, data_type), ...) из information_schema, с LRU-кешем"""
+        key = self._server_key + (catalog, schema, table)
+        columns = self._get_cached_columns(key)
+        if columns is not None:
+            return columns
+
+        logger.debug(f"Executing columns query for {catalog}.{schema}.{table}")
+        rows = conn.execute(self._STMT_COLUMNS, {"cat": catalog, "sch": schema, "tbl": table}).mappings()
+        columns = tuple((row['column_name'], row['data_type']) for row in rows)
+        self._cache_columns(key, columns)
+        return columns
+
+    def _bulk_fetch_columns(self, conn, table_fqns: Dict[str, tuple]) -> Dict[str, tuple]:
+        """
+        Колонки сразу для всех таблиц: один запрос к information_schema на пару (catalog, schema)
+        вместо запроса на каждую таблицу. table_fqns — имя таблицы -> (catalog, schema, table);
+        таблиц, которых нет в information_schema, в результате нет.
+        """
+        columns_by_table = {}
+        pending: Dict[tuple, Dict[str, str]] = {}
+        for table_name, (catalog, schema, table) in table_fqns.items():
+            if not catalog:
+                continue
+            columns = self._get_cached_columns(self._server_key + (catalog, schema, table))
+            if columns is not None:
+                columns_by_table[table_name] = columns
+            else:
+                pending.setdefault((catalog, schema), {})[table] = table_name
+
+        for (catalog, schema), tables in pending.items():
+            logger.debug(f"Executing bulk columns query for {len(tables)} tables in {catalog}.{schema}")
+            rows = conn.execute(self._STMT_COLUMNS_BULK, {"cat": catalog, "sch": schema, "tbls": list(tables)})
+            fetched: Dict[str, list] = {}
+            for row in rows.mappings():
+                fetched.setdefault(row['table_name'], []).append((row['column_name'], row['data_type']))
+
+            for table, columns in fetched.items():
+                if table in tables:
+                    columns = tuple(columns)
+                    self._cache_columns(self._server_key + (catalog, schema, table), columns)
+                    columns_by_table[tables[table]] = columns
+
+        return columns_by_table
+
+    @staticmethod
+    def _get_cached_columns(key: tuple) -> Optional[tuple]:
+        with _metadata_lock:
+            columns = _columns_cache.get(key)
+            if columns is not None:
+                _columns_cache.move_to_end(key)
+            return columns
+
+    @staticmethod
+    def _cache_columns(key: tuple, columns: tuple):
+        # Пустой результат не кешируем: таблица может появиться позже
+        if not columns:
+            return
+        with _metadata_lock:
+            _columns_cache[key] = columns
+            if len(_columns_cache) > METADATA_CACHE_SIZE:
+                _columns_cache.popitem(last=False)
+
+    @property
+    def _default_catalog(self) -> str:
+        """Каталог для имен таблиц без каталога"""
+        # Не кешируется: actual_catalog появляется только после connect()
+        return self.actual_catalog or self.connection_info.database or ''
+
+    def _split_fqn(self, table_name: str) -> tuple:
+        """Разбирает имя таблицы на (catalog, schema, table)"""
+        # Trino обычно использует 'default' schema
+        return split_table_name(table_name, self._default_catalog, 'default')
+
+    def _stats_cache_key(self, table_name: str, columns: Optional[tuple]) -> Optional[tuple]:
+        """Ключ статистики таблицы; без известных колонок (версии схемы) статистика не кешируется"""
+        if not columns:
+            return None
+        return self._server_key + self._split_fqn(table_name) + (columns, self.exact_distinct)
+
+    @staticmethod
+    def _get_cached_stats(key: tuple) -> Optional[TableStatistics]:
+        with _metadata_lock:
+            entry = _stats_cache.get(key)
+            if entry is None:
+                return None
+            cached_at, table_stats = entry
+            if time.monotonic() - cached_at > STATS_CACHE_TTL_SECONDS:
+                del _stats_cache[key]
+                return None
+            _stats_cache.move_to_end(key)
+            return table_stats
+
+    @staticmethod
+    def _cache_stats(key: tuple, table_stats: TableStatistics):
+        with _metadata_lock:
+            _stats_cache[key] = (time.monotonic(), table_stats)
+            _stats_cache.move_to_end(key)
+            if len(_stats_cache) > STATS_CACHE_SIZE:
+                _stats_cache.popitem(last=False)
+
+    def refresh_metadata(self):
+        """
+        Сбрасывает закешированные каталоги, обзор каталогов, колонки и статистику таблиц
+        этого кластера
+        """
+        key = self._server_key
+        with _metadata_lock:
+            _catalogs_cache.pop(key, None)
+            for cache in (_overview_cache, _columns_cache, _stats_cache):
+                for cached_key in [k for k in cache if k[:len(key)] == key]:
+                    del cache[cached_key]
+
     def connect(self) -> bool:
         """Устанавливает соединение с БД через SQLAlchemy"""
         try:
-            self.engine = create_engine(self.sqlalchemy_url)
+            # Соединения переиспользуются между запросами статистики, чтобы не платить
+            # за TLS/аутентификацию на каждый блок `with self.engine.connect()`
+            self.engine = create_engine(
+                self.sqlalchemy_url,
+                pool_size=self.pool_size,
+                max_overflow=POOL_MAX_OVERFLOW,
+                pool_recycle=POOL_RECYCLE_SECONDS,
+                query_cache_size=QUERY_CACHE_SIZE
+            )
 
             # Тестовый запрос для проверки соединения
             with self.engine.connect() as conn:
-                result = conn.execute(text("SELECT 1"))
+                result = conn.execute(self._STMT_PING)
                 result.fetchone()
 
                 # Определяем каталог для Trino
@@ -176,42 +492,94 @@ class DatabaseStatsCollector:
             logger.error(f"Failed to connect to database: {e}")
             return False
 
-    def collect_table_statistics(self, tables: List[str]) -> List[TableStatistics]:
-        """Собирает статистику по таблицам"""
+    def collect_table_statistics(self, tables: List[str], force_refresh: bool = False) -> List[TableStatistics]:
+        """
+        Собирает статистику по таблицам. Статистика, собранная ранее для той же схемы таблицы,
+        берется из кеша процесса; force_refresh=True собирает ее заново.
+        """
         if not self.engine:
             logger.error("No database connection")
             return []
 
-        stats = []
+        if not tables:
+            return []
+
+        # Колонки всех таблиц заранее, одним запросом на схему
+        try:
+            with self.engine.connect() as conn:
+                table_fqns = {table: self._split_fqn(table) for table in tables}
+                columns_by_table = self._bulk_fetch_columns(conn, table_fqns)
+        except Exception as e:
+            logger.warning(f"Failed to prefetch table columns, falling back to per-table queries: {e}")
+            columns_by_table = {}
+
+        # Запросы к таблицам независимы и ждут ответа Trino, поэтому выполняются параллельно;
+        # воркеров не больше, чем соединений в пуле, а map сохраняет порядок таблиц
+        max_workers = min(len(tables), self.pool_size)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(
+                lambda table: self._collect_table_stats_safe(table, columns_by_table.get(table), force_refresh),
+                tables
+            )
+            return [table_stats for table_stats in results if table_stats]
+
+    def _collect_table_stats_safe(
+            self, table: str, columns: Optional[tuple] = None, force_refresh: bool = False
+    ) -> Optional[TableStatistics]:
+        """Статистика по таблице; ошибка одной таблицы не прерывает сбор остальных"""
+        cache_key = self._stats_cache_key(table, columns)
+        if cache_key and not force_refresh:
+            table_stats = self._get_cached_stats(cache_key)
+            if table_stats is not None:
+                logger.debug(f"Using cached stats for table {table}")
+                return table_stats
 
-        for table in tables:
-            try:
-                table_stats = self._get_single_table_stats(table)
-                if table_stats:
-                    stats.append(table_stats)
-            except Exception as e:
-                logger.error(f"Failed to collect stats for table {table}: {e}")
+        try:
+            table_stats = self._get_single_table_stats(table, columns)
+        except Exception as e:
+            logger.error(f"Failed to collect stats for table {table}: {e}")
+            return None
 
-        return stats
+        if cache_key and table_stats is not None:
+            self._cache_stats(cache_key, table_stats)
+        return table_stats
 
-    def _get_single_table_stats(self, table_name: str) -> Optional[TableStatistics]:
+    def _get_single_table_stats(self, table_name: str, columns: Optional[tuple] = None) -> Optional[TableStatistics]:
         """Собирает статистику по одной таблице (обновленная версия)"""
         try:
             with self.engine.connect() as conn:
-                # Подсчет строк
-                count_query = f"SELECT COUNT(*) as row_count FROM {table_name}"
-                row_count = int(conn.execute(text(count_query)).scalar_one())
+                # Получаем реальные метаданные таблицы. SHOW STATS есть только в Trino: в PostgreSQL
+                # ошибка прервала бы транзакцию, и все следующие запросы на этом соединении упали бы
+                if self.connection_info.driver == 'trino':
+                    table_metadata = self._get_table_metadata(conn, table_name)
+                else:
+                    table_metadata = {}
 
-                # Информация о колонках
-                column_stats = self._get_column_statistics(conn, table_name)
+                # Число строк берем из SHOW STATS; для непроанализированных таблиц оно
+                # считается тем же сканом, что и статистика колонок
+                row_count = table_metadata.get('row_count')
 
-                # Получаем реальные метаданные таблицы
-                table_metadata = self._get_table_metadata(conn, table_name)
+                # Информация о колонках; то, что уже есть в SHOW STATS, не пересчитывается
+                column_stats, scanned_row_count = self._get_column_statistics(
+                    conn, table_name, row_count, pre_stats=table_metadata.get('column_stats'), columns=columns
+                )
+
+                if row_count is None:
+                    row_count = scanned_row_count
+                if row_count is None:
+                    logger.debug(f"No row_count in SHOW STATS for {table_name} "
+                                 f"(consider ANALYZE), falling back to COUNT(*)")
+                    count_query = f"SELECT COUNT(*) as row_count FROM {_quote_table_name(table_name)}"
+                    row_count = int(conn.execute(text(count_query)).scalar_one())
+
+                size_bytes = table_metadata.get('size_bytes')
+                if size_bytes is None:
+                    size_bytes = self._estimate_table_size(row_count, column_stats)
 
                 return TableStatistics(
                     table_name=table_name,
                     row_count=row_count,
-                    size_bytes=table_metadata.get('size_bytes', 0),
+                    size_bytes=size_bytes,
                     column_stats=column_stats,
                     partitioning_columns=table_metadata.get('partitioning', []),
                     index_usage=[],
@@ -223,17 +591,28 @@ class DatabaseStatsCollector:
             return None
 
     def _get_table_metadata(self, conn, table_name: str) -> Dict:
-        """Получает метаданные таблицы, включая размер и партиционирование, через SHOW STATS."""
+        """
+        Получает метаданные таблицы через SHOW STATS: число строк, размер и поколоночную
+        статистику. Ключей row_count/size_bytes нет, если SHOW STATS их не вернул.
+        """
         metadata = {}
         try:
             # Этот запрос предоставляет подробную статистику в Trino, включая размер данных
-            stats_query = f"SHOW STATS FOR {table_name}"
-            stats_df = pd.read_sql(stats_query, conn)
-
-            total_stats = stats_df[stats_df['column_name'].isnull()]
-            if not total_stats.empty:
-                if 'data_size' in total_stats.columns and not pd.isna(total_stats['data_size'].iloc[0]):
-                    metadata['size_bytes'] = int(total_stats['data_size'].iloc[0])
+            stats_query = f"SHOW STATS FOR {_quote_table_name(table_name)}"
+            rows = conn.execute(text(stats_query)).mappings().all()
+
+            # Строка с column_name = NULL (в Trino последняя) — итог по таблице, остальные — по колонкам
+            total_row = next((row for row in reversed(rows) if row['column_name'] is None), None)
+            if total_row is not None:
+                if total_row.get('data_size') is not None:
+                    metadata['size_bytes'] = int(total_row['data_size'])
+                if total_row.get('row_count') is not None:
+                    metadata['row_count'] = int(total_row['row_count'])
+
+            # Поколоночная статистика: distinct_values_count, nulls_fraction, low/high_value
+            metadata['column_stats'] = {
+                row['column_name']: dict(row) for row in rows if row['column_name'] is not None
+            }
 
             # (синтаксис может зависеть от коннектора: Hive, Iceberg и т.д.)
             # desc_query = f"DESCRIBE {table_name}"
@@ -241,118 +620,197 @@ class DatabaseStatsCollector:
 
         except Exception as e:
             logger.warning(f"Could not get detailed metadata for {table_name} via SHOW STATS: {e}")
-            if 'size_bytes' not in metadata:
-                metadata['size_bytes'] = self._estimate_table_size(conn, table_name, 0)  # row_count здесь не нужен
 
         return metadata
 
-    def _get_column_statistics(self, conn, table_name: str) -> Dict[str, Dict]:
-        """Собирает статистику по колонкам"""
+    def _get_column_statistics(
+            self,
+            conn,
+            table_name: str,
+            row_count: Optional[int] = None,
+            pre_stats: Optional[Dict[str, Dict]] = None,
+            columns: Optional[tuple] = None
+    ) -> Tuple[Dict[str, Dict], Optional[int]]:
+        """
+        Собирает статистику по колонкам. columns — уже известные колонки таблицы
+        ((column_name, data_type), ...); без них они запрашиваются из information_schema.
+
+        Колонки, для которых SHOW STATS (pre_stats) уже дает distinct/nulls и min/max,
+        берутся оттуда без скана таблицы (avg_value для них не считается);
+        остальные считаются агрегирующими запросами.
+
+        Таблицы Trino больше SAMPLE_ROW_THRESHOLD строк сканируются по выборке: null_count
+        масштабируется на всю таблицу, distinct_count остается оценкой снизу по выборке,
+        а в статистике колонки ставится sampled: True.
+
+        Возвращает статистику колонок и число строк, если таблица сканировалась целиком (иначе None).
+        """
         column_stats = {}
+        scanned_row_count = None
+        sample_percent = None
+        if (row_count is not None and row_count > SAMPLE_ROW_THRESHOLD
+                and self.connection_info.driver == 'trino'):
+            sample_percent = SAMPLE_PERCENT
 
         try:
-            # Парсим имя таблицы
-            parts = table_name.split('.')
-            if len(parts) == 3:
-                catalog, schema, table = parts
-            elif len(parts) == 2:
-                catalog = self.actual_catalog or self.connection_info.database
-                schema, table = parts
-            else:
-                catalog = self.actual_catalog or self.connection_info.database
-                schema = 'default'  # Trino обычно использует 'default' schema
-                table = parts[0]
+            if columns is None:
+                # Парсим имя таблицы
+                catalog, schema, table = self._split_fqn(table_name)
 
-            if not catalog:
-                logger.error(f"Cannot determine catalog for table {table_name}")
-                return {}
-
-            # Запрос информации о колонках
-            columns_query = f"""
-                SELECT column_name, data_type, is_nullable
-                FROM information_schema.columns 
-                WHERE table_catalog = '{catalog}' 
-                AND table_schema = '{schema}' 
-                AND table_name = '{table}'
-                ORDER BY ordinal_position
-            """
-
-            logger.debug(f"Executing columns query: {columns_query}")
-            columns_df = pd.read_sql(columns_query, conn)
-
-            # Ограничиваем количество колонок для анализа
-            for idx, row in columns_df.iterrows():
-                column_name = row['column_name']
-                data_type = row['data_type']
+                if not catalog:
+                    logger.error(f"Cannot determine catalog for table {table_name}")
+                    return {}, None
 
+                # Информация о колонках
+                columns = self._fetch_columns(conn, catalog, schema, table)
+
+            # Без числа строк nulls_fraction не переводится в null_count
+            pre_stats = (pre_stats or {}) if row_count is not None else {}
+            live_columns = []
+            for column_name, data_type in columns:
+                known_stats = self._column_stats_from_show_stats(data_type, row_count, pre_stats.get(column_name))
+                if known_stats is None:
+                    live_columns.append((column_name, data_type))
+                else:
+                    column_stats[column_name] = known_stats
+
+            # Агрегаты по всем колонкам собираются одним сканом таблицы на группу колонок
+            for start in range(0, len(live_columns), COLUMN_STATS_CHUNK_SIZE):
+                chunk = live_columns[start:start + COLUMN_STATS_CHUNK_SIZE]
                 try:
-                    # Базовая статистика
-                    basic_stats_query = f"""
-                        SELECT 
-                            COUNT(DISTINCT {column_name}) as distinct_count,
-                            COUNT(*) - COUNT({column_name}) as null_count
-                        FROM {table_name}
-                    """
-
-                    stats_result = conn.execute(text(basic_stats_query))
-                    stats_row = stats_result.fetchone()
-
-                    column_stats[column_name] = {
-                        'data_type': data_type,
-                        'distinct_count': int(stats_row[0]) if stats_row[0] is not None else 0,
-                        'null_count': int(stats_row[1]) if stats_row[1] is not None else 0
-                    }
-
-                    # Числовая статистика
-                    if data_type.lower() in ['integer', 'bigint', 'double', 'real', 'decimal']:
-                        try:
-                            numeric_stats_query = f"""
-                                SELECT 
-                                    MIN({column_name}) as min_value,
-                                    MAX({column_name}) as max_value,
-                                    AVG(CAST({column_name} AS DOUBLE)) as avg_value
-                                FROM {table_name}
-                                WHERE {column_name} IS NOT NULL
-                            """
-
-                            numeric_result = conn.execute(text(numeric_stats_query))
-                            numeric_row = numeric_result.fetchone()
-
-                            if numeric_row and any(x is not None for x in numeric_row):
-                                column_stats[column_name].update({
-                                    'min_value': float(numeric_row[0]) if numeric_row[0] is not None else None,
-                                    'max_value': float(numeric_row[1]) if numeric_row[1] is not None else None,
-                                    'avg_value': float(numeric_row[2]) if numeric_row[2] is not None else None
-                                })
-                        except Exception as num_e:
-                            logger.warning(f"Failed to get numeric stats for {column_name}: {num_e}")
-
+                    scanned_row_count, chunk_stats = self._query_column_stats(
+                        conn, table_name, chunk, sample_percent
+                    )
+                    column_stats.update(chunk_stats)
                 except Exception as e:
-                    logger.warning(f"Failed to get stats for column {column_name}: {e}")
-                    column_stats[column_name] = {
-                        'data_type': data_type,
-                        'error': str(e)
-                    }
+                    # Одна проблемная колонка не должна лишать статистики всю группу
+                    logger.warning(f"Failed to get fused column stats for {table_name}, "
+                                   f"falling back to per-column queries: {e}")
+                    for column_name, data_type in chunk:
+                        try:
+                            scanned_row_count, chunk_stats = self._query_column_stats(
+                                conn, table_name, [(column_name, data_type)], sample_percent
+                            )
+                            column_stats.update(chunk_stats)
+                        except Exception as col_e:
+                            logger.warning(f"Failed to get stats for column {column_name}: {col_e}")
+                            column_stats[column_name] = {
+                                'data_type': data_type,
+                                'error': str(col_e)
+                            }
+
+            # COUNT(*) по выборке — не число строк таблицы
+            if sample_percent:
+                scanned_row_count = None
+
+            # Порядок колонок как в таблице, независимо от источника статистики
+            column_stats = {name: column_stats[name] for name, _ in columns if name in column_stats}
 
         except Exception as e:
             logger.error(f"Failed to get column stats for {table_name}: {e}")
 
-        return column_stats
+        return column_stats, scanned_row_count
 
-    def _estimate_table_size(self, conn, table_name: str, row_count: int) -> int:
-        """Оценивает размер таблицы"""
-        try:
-            if row_count > 0:
-                estimated_row_size = 200  # байт на строку
-                return row_count * estimated_row_size
-            return 0
+    def _column_stats_from_show_stats(self, data_type: str, row_count: int, stats: Optional[Dict]) -> Optional[Dict]:
+        """Статистика колонки из строки SHOW STATS; None, если каких-то значений там нет"""
+        if not stats or stats.get('distinct_values_count') is None or stats.get('nulls_fraction') is None:
+            return None
 
-        except Exception as e:
-            logger.warning(f"Could not estimate table size for {table_name}: {e}")
-            return 0
+        column_stats = {
+            'data_type': data_type,
+            'distinct_count': int(stats['distinct_values_count']),
+            'null_count': int(round(stats['nulls_fraction'] * row_count))
+        }
 
-    def get_database_overview(self) -> Dict:
-        """Получает общую информацию о БД"""
+        if self._is_numeric_type(data_type):
+            low_value, high_value = stats.get('low_value'), stats.get('high_value')
+            if low_value is None or high_value is None:
+                # У пустых и константных колонок min/max/avg ничего не говорят — сканировать
+                # таблицу ради них не стоит
+                if column_stats['distinct_count'] > 1:
+                    return None
+                column_stats.update({'min_value': None, 'max_value': None, 'avg_value': None})
+            else:
+                column_stats['min_value'] = float(low_value)
+                column_stats['max_value'] = float(high_value)
+
+        return column_stats
+
+    def _query_column_stats(
+            self, conn, table_name: str, columns: List[tuple], sample_percent: Optional[float] = None
+    ) -> Tuple[int, Dict[str, Dict]]:
+        """
+        Считает distinct/null и min/max/avg (для числовых) по группе колонок одним запросом.
+        Тот же скан дает и число строк таблицы, оно возвращается первым элементом.
+        С sample_percent агрегаты считаются по выборке строк, а null_count пересчитывается на всю таблицу.
+        """
+        # approx_distinct есть только в Trino, для остальных драйверов считаем точно
+        use_approx = not self.exact_distinct and self.connection_info.driver == 'trino'
+        distinct_template = "approx_distinct({})" if use_approx else "COUNT(DISTINCT {})"
+        expressions = ["COUNT(*)"]
+        for column_name, data_type in columns:
+            column = _quote_identifier(column_name)
+            expressions.append(distinct_template.format(column))
+            expressions.append(f"COUNT(*) - COUNT({column})")
+            if self._is_numeric_type(data_type):
+                expressions.append(f"MIN({column})")
+                expressions.append(f"MAX({column})")
+                expressions.append(f"AVG(CAST({column} AS DOUBLE))")
+
+        stats_query = f"SELECT {', '.join(expressions)} FROM {_quote_table_name(table_name)}"
+        if sample_percent:
+            stats_query += f" TABLESAMPLE BERNOULLI ({sample_percent})"
+        values = iter(conn.execute(text(stats_query)).fetchone())
+        # COUNT/approx_distinct не бывают NULL и приходят от драйвера целыми, приводить их не нужно
+        row_count = next(values)
+
+        # Значения идут в порядке выражений, поэтому разбираются тем же обходом колонок
+        column_stats = {}
+        for column_name, data_type in columns:
+            column_stats[column_name] = {
+                'data_type': data_type,
+                'distinct_count': next(values),
+                'null_count': next(values)
+            }
+            if sample_percent:
+                stats = column_stats[column_name]
+                stats['null_count'] = round(stats['null_count'] * 100 / sample_percent)
+                stats['sampled'] = True
+
+            if self._is_numeric_type(data_type):
+                # MIN/MAX сохраняют тип колонки (Decimal, int), поэтому к float приводятся явно
+                numeric_row = (next(values), next(values), next(values))
+                if any(x is not None for x in numeric_row):
+                    column_stats[column_name].update({
+                        'min_value': float(numeric_row[0]) if numeric_row[0] is not None else None,
+                        'max_value': float(numeric_row[1]) if numeric_row[1] is not None else None,
+                        'avg_value': float(numeric_row[2]) if numeric_row[2] is not None else None
+                    })
+
+        return row_count, column_stats
+
+    @staticmethod
+    def _is_numeric_type(data_type: str) -> bool:
+        """Нужна ли для колонки числовая статистика (min/max/avg)"""
+        return _base_type(data_type) in _NUMERIC_TYPES
+
+    @staticmethod
+    def _estimate_table_size(row_count: int, column_stats: Optional[Dict[str, Dict]] = None) -> int:
+        """Оценивает размер таблицы по ширине типов ее колонок"""
+        if column_stats:
+            row_width = sum(
+                _TYPE_WIDTHS.get(_base_type(stats.get('data_type') or ''), DEFAULT_TYPE_WIDTH)
+                for stats in column_stats.values()
+            )
+        else:
+            row_width = DEFAULT_ROW_WIDTH
+        return max(row_count, 0) * row_width
+
+    def get_database_overview(self, include_sample_tables: bool = False) -> Dict:
+        """
+        Получает общую информацию о БД. С include_sample_tables в sample_tables добавляются
+        первые таблицы каталога (schema.table) — тем же соединением, без отдельного подключения.
+        """
         if not self.engine:
             return {'error': 'No database connection'}
 
@@ -364,43 +822,50 @@ class DatabaseStatsCollector:
             'connection_successful': True
         }
 
+        # Версия, схемы и число таблиц каталога берутся из кеша метаданных, если уже собирались
+        cache_key = self._server_key + (self.actual_catalog,)
+        with _metadata_lock:
+            cached = _overview_cache.get(cache_key)
+        if cached is not None:
+            overview.update(cached, schemas=list(cached['schemas']))
+            if not include_sample_tables:
+                return overview
+
         try:
             with self.engine.connect() as conn:
-                # Версия БД
-                if self.connection_info.driver == 'trino':
-                    version_df = pd.read_sql("SELECT version()", conn)
-                    overview['version'] = str(version_df.iloc[0, 0])
-
                 # Используем фактический каталог
                 catalog = self.actual_catalog
-                if not catalog:
-                    overview['error'] = 'No catalog available'
-                    return safe_json_serialize(overview)
-
-                # Список схем
-                schemas_query = f"""
-                    SELECT schema_name 
-                    FROM information_schema.schemata 
-                    WHERE catalog_name = '{catalog}'
-                """
-                logger.debug(f"Executing schemas query: {schemas_query}")
-                schemas_df = pd.read_sql(schemas_query, conn)
-                overview['schemas'] = [str(schema) for schema in schemas_df['schema_name'].tolist()]
-
-                # Общее количество таблиц
-                tables_query = f"""
-                    SELECT COUNT(*) as table_count
-                    FROM information_schema.tables 
-                    WHERE table_catalog = '{catalog}'
-                """
-                tables_df = pd.read_sql(tables_query, conn)
-                overview['total_tables'] = int(tables_df.iloc[0, 0])
+
+                if cached is None:
+                    # Версия БД
+                    if self.connection_info.driver == 'trino':
+                        overview['version'] = str(conn.execute(self._STMT_VERSION).scalar_one())
+
+                    if not catalog:
+                        overview['error'] = 'No catalog available'
+                        return overview
+
+                    # Список схем
+                    logger.debug(f"Executing schemas query for catalog {catalog}")
+                    schema_names = conn.execute(self._STMT_SCHEMAS, {"cat": catalog}).scalars()
+                    overview['schemas'] = [str(schema) for schema in schema_names]
+
+                    # Общее количество таблиц
+                    overview['total_tables'] = int(conn.execute(self._STMT_TABLES, {"cat": catalog}).scalar_one())
+
+                    fetched = {k: overview[k] for k in ('version', 'schemas', 'total_tables') if k in overview}
+                    with _metadata_lock:
+                        _overview_cache[cache_key] = {**fetched, 'schemas': list(fetched['schemas'])}
+
+                if include_sample_tables:
+                    rows = conn.execute(self._STMT_TABLES_SAMPLE, {"cat": catalog}).all()
+                    overview['sample_tables'] = [f"{schema}.{name}" for schema, name in rows]
 
         except Exception as e:
             overview['error'] = str(e)
             logger.error(f"Error getting database overview: {e}")
 
-        return safe_json_serialize(overview)
+        return overview
 
     def close(self):
         """Закрывает соединение с БД"""
@@ -416,27 +881,19 @@ def test_connection(jdbc_url: str) -> bool:
         success = collector.connect()
 
         if success:
-            overview = collector.get_database_overview()
+            # Тестовый запрос выполняется тем же соединением, что и обзор
+            overview = collector.get_database_overview(include_sample_tables=True)
+            sample_tables = overview.pop('sample_tables', None)
             print("Connection successful!")
-            print(f"Database overview: {json.dumps(overview, indent=2, ensure_ascii=False)}")
-
-            # Тестовый запрос
-            try:
-                catalog = collector.actual_catalog
-                if catalog:
-                    with collector.engine.connect() as conn:
-                        test_df = pd.read_sql(f"""
-                            SELECT table_schema, table_name 
-                            FROM information_schema.tables 
-                            WHERE table_catalog = '{catalog}'
-                            LIMIT 5
-                        """, conn)
-                        print(f"\nFound {len(test_df)} tables:")
-                        if not test_df.empty:
-                            for _, row in test_df.iterrows():
-                                print(f"  - {row['table_schema']}.{row['table_name']}")
-            except Exception as query_e:
-                print(f"Test query failed: {query_e}")
+            # JSON пишется байтами прямо в stdout, без промежуточной str
+            print("Database overview: ", end="", flush=True)
+            sys.stdout.buffer.write(to_json_bytes(overview, orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE))
+            sys.stdout.buffer.flush()
+
+            if sample_tables is not None:
+                print(f"\nFound {len(sample_tables)} tables:")
+                for table in sample_tables:
+                    print(f"  - {table}")
 
         collector.close()
         return success
@@ -1,12 +1,38 @@
 # ddl_parser.py
 import re
+import sys
 import json
+from collections import Counter, defaultdict
 from dataclasses import dataclass
-from typing import List, Dict, Optional
-import sqlparse
-
-
-@dataclass
+from functools import lru_cache
+from typing import Iterator, List, Dict, Optional, Tuple
+
+# Разобранные CREATE TABLE по тексту DDL: одни и те же схемы приходят в задачах повторно
+PARSED_DDL_CACHE_SIZE = 1024
+
+# Паттерны разбора DDL компилируются один раз при импорте
+_TABLE_NAME_RE = re.compile(r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?([^\s(]+)', re.IGNORECASE)
+# Таблица после FROM/JOIN в тексте запроса, в том числе catalog.schema.table и в кавычках
+_TABLE_REFERENCE_RE = re.compile(r'\b(?:from|join)\s+([a-z_"][a-z0-9_."]*)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def split_table_name(full_name: str, default_catalog: str = "", default_schema: str = "") -> tuple:
+    """
+    Разбирает имя таблицы на (catalog, schema, table); недостающие части берутся из
+    значений по умолчанию. Общий разбор для DDL и сборщика статистики, имена повторяются,
+    поэтому результат кешируется.
+    """
+    # Каталог и схема одни и те же у многих таблиц, поэтому строки интернируются
+    parts = [sys.intern(part) for part in full_name.split('.')]
+    if len(parts) == 3:
+        return parts[0], parts[1], parts[2]
+    if len(parts) == 2:
+        return default_catalog, parts[0], parts[1]
+    return default_catalog, default_schema, parts[0]
+
+
+@dataclass(slots=True)
 class Column:
     name: str
     data_type: str
@@ -14,15 +40,29 @@ class Column:
     constraints: List[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Table:
     catalog: str
     schema: str
     name: str
-    columns: List[Column]
+    # Кортеж: закешированные таблицы разделяются между задачами и не должны меняться
+    columns: Tuple[Column, ...]
     indexes: List[str] = None
     constraints: List[str] = None
 
+    def to_dict(self) -> Dict:
+        """Проекция таблицы для результата анализа"""
+        return {
+            'full_name': f"{self.catalog}.{self.schema}.{self.name}",
+            'catalog': self.catalog,
+            'schema': self.schema,
+            'name': self.name,
+            'columns': [
+                {'name': c.name, 'type': c.data_type}
+                for c in self.columns
+            ]
+        }
+
 
 class DDLParser:
     def __init__(self):
@@ -30,63 +70,69 @@ class DDLParser:
 
     def parse_ddl_statements(self, ddl_list: List[Dict]) -> List[Table]:
         """Парсит DDL statements и извлекает структуру таблиц"""
-        tables = []
+        return list(self.iter_tables(ddl_list))
 
+    def iter_tables(self, ddl_list: List[Dict]) -> Iterator[Table]:
+        """Лениво парсит DDL statements, отдавая таблицы по одной"""
         for ddl_item in ddl_list:
             statement = ddl_item['statement']
             table = self._parse_create_table(statement)
             if table:
-                tables.append(table)
-
-        return tables
+                yield table
 
     def _parse_create_table(self, ddl: str) -> Optional[Table]:
-        """Парсит CREATE TABLE statement"""
+        """Парсит CREATE TABLE statement; результат кешируется по тексту DDL"""
+        return _parse_create_table_cached(ddl)
+
+    def _build_table(self, ddl: str) -> Optional[Table]:
+        """Разбирает CREATE TABLE statement без кеша"""
         try:
-            parsed = sqlparse.parse(ddl)[0]
+            # Пустые и не CREATE TABLE statements пропускаем: иначе из них получалась бы
+            # таблица без имени и колонок
+            match = _TABLE_NAME_RE.search(ddl)
+            if not match:
+                return None
 
             # Извлекаем имя таблицы
-            table_name = self._extract_table_name(ddl)
-            catalog, schema, name = self._parse_full_table_name(table_name)
+            catalog, schema, name = split_table_name(match.group(1))
 
             # Извлекаем колонки
-            columns = self._extract_columns(ddl)
+            columns = self._extract_columns(ddl, match.end())
 
             return Table(
                 catalog=catalog,
                 schema=schema,
                 name=name,
-                columns=columns
+                columns=tuple(columns)
             )
         except Exception as e:
             print(f"Error parsing DDL: {e}")
             return None
 
-    def _extract_table_name(self, ddl: str) -> str:
-        """Извлекает полное имя таблицы из DDL"""
-        match = re.search(r'CREATE TABLE\s+([^\s(]+)', ddl, re.IGNORECASE)
-        return match.group(1) if match else ""
-
-    def _parse_full_table_name(self, full_name: str) -> tuple:
-        """Разбирает полное имя таблицы на каталог, схему и имя"""
-        parts = full_name.split('.')
-        if len(parts) == 3:
-            return parts[0], parts[1], parts[2]
-        elif len(parts) == 2:
-            return "", parts[0], parts[1]
-        else:
-            return "", "", parts[0]
-
-    def _extract_columns(self, ddl: str) -> List[Column]:
-        """Извлекает информацию о колонках"""
+    def _extract_columns(self, ddl: str, start: int = 0) -> List[Column]:
+        """Извлекает информацию о колонках; start — позиция сразу после имени таблицы"""
         columns = []
 
-        # Ищем содержимое между скобками после имени таблицы
-        match = re.search(r'CREATE TABLE[^(]+\((.*)\)\s*WITH', ddl, re.IGNORECASE | re.DOTALL)
-        if not match:
+        # Список колонок — скобки, идущие сразу за именем таблицы (CTAS и т.п. их не имеют)
+        open_pos = ddl.find('(', start)
+        if open_pos < 0 or ddl[start:open_pos].strip():
+            return columns
+
+        # Парная закрывающая скобка ищется одним проходом с учетом вложенности, так что
+        # WITH (...) после списка колонок не обязателен и не попадает в него
+        depth = 0
+        for i in range(open_pos, len(ddl)):
+            char = ddl[i]
+            if char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+                if depth == 0:
+                    break
+        else:
             return columns
 
-        columns_text = match.group(1)
+        columns_text = ddl[open_pos + 1:i]
 
         # Разбиваем на отдельные определения колонок
         column_defs = self._split_column_definitions(columns_text)
@@ -100,8 +146,21 @@ class DDLParser:
 
     def _split_column_definitions(self, columns_text: str) -> List[str]:
         """Разбивает текст колонок на отдельные определения"""
-        # Простое разбиение по запятым (может потребовать улучшения для сложных случаев)
-        return [col.strip() for col in columns_text.split(',') if col.strip()]
+        # Один проход с учетом глубины скобок: запятые внутри decimal(10,2) или row(a int, b int)
+        # не разделяют колонки
+        definitions = []
+        depth = 0
+        start = 0
+        for i, char in enumerate(columns_text):
+            if char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+            elif char == ',' and depth == 0:
+                definitions.append(columns_text[start:i])
+                start = i + 1
+        definitions.append(columns_text[start:])
+        return [col.strip() for col in definitions if col.strip()]
 
     def _parse_column_definition(self, col_def: str) -> Optional[Column]:
         """Парсит определение одной колонки"""
@@ -113,41 +172,37 @@ class DDLParser:
             name = parts[0]
             data_type = parts[1]
 
-            # Обработка составных типов данных (например, varchar(255))
-            if '(' in data_type and ')' not in data_type and len(parts) > 2:
-                data_type += parts[2]
+            # Обработка составных типов данных (например, decimal(10, 2) или row(a int, b int)):
+            # дописываем части, пока скобки не закроются
+            next_part = 2
+            while data_type.count('(') > data_type.count(')') and next_part < len(parts):
+                data_type += ' ' + parts[next_part]
+                next_part += 1
 
-            return Column(name=name, data_type=data_type)
+            # Типов немного, а колонок тысячи: одинаковые строки типов хранятся в одном экземпляре
+            return Column(name=name, data_type=sys.intern(data_type))
         except Exception as e:
             print(f"Error parsing column definition '{col_def}': {e}")
             return None
 
     def get_table_stats(self, tables: List[Table]) -> Dict:
         """Собирает статистику по таблицам"""
+        # Схемы, типы колонок и число колонок считаются за один проход по таблицам
+        schema_counts = Counter()
+        type_counts = Counter()
+        total_columns = 0
+        for table in tables:
+            schema_counts[f"{table.catalog}.{table.schema}"] += 1
+            type_counts.update(column.data_type.split('(', 1)[0].lower() for column in table.columns)
+            total_columns += len(table.columns)
+
         return {
             'total_tables': len(tables),
-            'total_columns': sum(len(table.columns) for table in tables),
-            'tables_by_schema': self._group_by_schema(tables),
-            'column_types_distribution': self._get_column_types_stats(tables)
+            'total_columns': total_columns,
+            'tables_by_schema': dict(schema_counts),
+            'column_types_distribution': dict(type_counts)
         }
 
-    def _group_by_schema(self, tables: List[Table]) -> Dict[str, int]:
-        """Группирует таблицы по схемам"""
-        schema_counts = {}
-        for table in tables:
-            schema_key = f"{table.catalog}.{table.schema}"
-            schema_counts[schema_key] = schema_counts.get(schema_key, 0) + 1
-        return schema_counts
-
-    def _get_column_types_stats(self, tables: List[Table]) -> Dict[str, int]:
-        """Статистика по типам колонок"""
-        type_counts = {}
-        for table in tables:
-            for column in table.columns:
-                base_type = column.data_type.split('(')[0].lower()
-                type_counts[base_type] = type_counts.get(base_type, 0) + 1
-        return type_counts
-
     def get_schema_insights(self, tables: List[Table], queries: List[Dict] = None) -> Dict:
         """
         Generate comprehensive schema insights for the analysis report.
@@ -176,8 +231,15 @@ class DDLParser:
         table_details = []
         total_indexed = 0
         total_indexes = 0
+        total_columns = 0
+
+        # Запросы просматриваются один раз, а не для каждой таблицы
+        table_executions = self._build_query_activity(queries) if queries else None
 
         for table in tables:
+            column_count = len(table.columns)
+            total_columns += column_count
+
             # Extract primary key info from constraints
             has_primary_key = self._has_primary_key(table)
 
@@ -188,12 +250,15 @@ class DDLParser:
                 total_indexes += index_count + (1 if has_primary_key else 0)
 
             # Estimate rows based on queries if available
-            estimated_rows = self._estimate_table_rows(table, queries) if queries else 0
+            if table_executions is not None:
+                estimated_rows = self._bucket_rows(table_executions.get(table.name.lower(), 0))
+            else:
+                estimated_rows = 0
 
             table_details.append({
                 "name": f"{table.schema}.{table.name}" if table.schema else table.name,
                 "full_name": f"{table.catalog}.{table.schema}.{table.name}",
-                "column_count": len(table.columns),
+                "column_count": column_count,
                 "estimated_rows": estimated_rows,
                 "has_primary_key": has_primary_key,
                 "index_count": index_count
@@ -209,7 +274,7 @@ class DDLParser:
         )
 
         return {
-            "total_columns": sum(len(table.columns) for table in tables),
+            "total_columns": total_columns,
             "total_tables": total_tables,
             "tables": sorted(table_details, key=lambda x: x['column_count'], reverse=True),
             "index_coverage": {
@@ -230,24 +295,30 @@ class DDLParser:
                 return True
         return False
 
-    def _estimate_table_rows(self, table: Table, queries: List[Dict]) -> int:
+    def _build_query_activity(self, queries: List[Dict]) -> Dict[str, int]:
+        """
+        Sum query executions per referenced table name (lowercase, without catalog/schema)
+        in a single pass over the queries.
+        """
+        table_executions = defaultdict(int)
+        for query_data in queries:
+            # A table joined to itself still counts the query once
+            referenced = {
+                reference.replace('"', '').rsplit('.', 1)[-1].lower()
+                for reference in _TABLE_REFERENCE_RE.findall(query_data.get('query', ''))
+            }
+            # Use runquantity as a proxy for activity
+            run_quantity = query_data.get('runquantity', 0)
+            for table_name in referenced:
+                table_executions[table_name] += run_quantity
+        return table_executions
+
+    @staticmethod
+    def _bucket_rows(total_executions: int) -> int:
         """
         Estimate table row count based on query execution data.
         This is a simple heuristic - you can improve it with actual row counts.
         """
-        if not queries:
-            return 0
-
-        # Look for queries that reference this table
-        table_name = table.name.lower()
-        total_executions = 0
-
-        for query_data in queries:
-            query = query_data.get('query', '').lower()
-            if f'from {table_name}' in query or f'join {table_name}' in query:
-                # Use runquantity as a proxy for activity
-                total_executions += query_data.get('runquantity', 0)
-
         # Simple heuristic: higher query volume suggests more rows
         # This is just an estimate - adjust the multiplier as needed
         if total_executions > 10000:
@@ -274,6 +345,15 @@ class DDLParser:
             return f"✅ Good index coverage ({coverage:.0f}%). Monitor query performance to maintain optimal indexing."
 
 
+# Методы разбора не зависят от состояния парсера, поэтому кеш общий для всех экземпляров
+_shared_parser = DDLParser()
+
+
+@lru_cache(maxsize=PARSED_DDL_CACHE_SIZE)
+def _parse_create_table_cached(ddl: str) -> Optional[Table]:
+    return _shared_parser._build_table(ddl)
+
+
 # Пример использования
 if __name__ == "__main__":
     # Пример входных данных
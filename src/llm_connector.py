@@ -1,4 +1,10 @@
 import os
+import random
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from time import sleep
+import openai
 from langchain_openai.chat_models import ChatOpenAI
 from dotenv import load_dotenv, find_dotenv
 from loguru import logger
@@ -14,8 +20,32 @@ class RewrittenQueries(BaseModel):
 
 load_dotenv(find_dotenv())
 
+# Structured-output runnables per (model, output format); binding derives the JSON schema
+# and tool definition, so it is done once per pair instead of on every call
+STRUCTURED_OUTPUT_CACHE_SIZE = 32
+_structured_models: "OrderedDict[tuple, tuple]" = OrderedDict()
+_structured_lock = threading.Lock()
+
+# Exponential backoff between LLM retries, in seconds, plus up to RETRY_BASE_DELAY of jitter
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+# Retrying cannot fix these, with either model
+_NON_RETRYABLE_ERRORS = (openai.AuthenticationError, openai.PermissionDeniedError)
+# The request itself was rejected (e.g. context too long, unknown model); the fallback model may still accept it
+_MODEL_REJECTED_ERRORS = (openai.BadRequestError, openai.NotFoundError, openai.UnprocessableEntityError)
+
 def get_llm(model_name: str, max_tokens=16000, provider="openrouter") -> ChatOpenAI:
-    """Initializes and returns a ChatOpenAI instance for OpenRouter."""
+    """Returns a ChatOpenAI instance for OpenRouter (or Ollama), shared between calls with the same arguments."""
+    return _build_llm(model_name, max_tokens, provider)
+
+
+@lru_cache(maxsize=8)
+def _build_llm(model_name: str, max_tokens: int, provider: str) -> ChatOpenAI:
+    """
+    Initializes a ChatOpenAI instance. Instances are cached so their HTTP connection pool
+    is reused across pipeline runs; the API key and Ollama settings are read from the
+    environment on first use, so call `_build_llm.cache_clear()` after changing them.
+    """
     if provider == "ollama":
         ollama_host = os.getenv("OLLAMA_HOST", "localhost")
         ollama_port = os.getenv("OLLAMA_PORT", "11434")
@@ -40,31 +70,75 @@ def get_llm(model_name: str, max_tokens=16000, provider="openrouter") -> ChatOpe
         }
     )
 
+def _bind_structured_output(model: ChatOpenAI, output_format: BaseModel):
+    """Returns `model.with_structured_output(output_format)`, cached per model instance and format."""
+    # ChatOpenAI is not hashable; the entry keeps the model alive, so its id stays unique
+    key = (id(model), output_format)
+    with _structured_lock:
+        entry = _structured_models.get(key)
+        if entry is not None:
+            _structured_models.move_to_end(key)
+            return entry[1]
+
+    structured_model = model.with_structured_output(output_format)
+    with _structured_lock:
+        _structured_models[key] = (model, structured_model)
+        _structured_models.move_to_end(key)
+        if len(_structured_models) > STRUCTURED_OUTPUT_CACHE_SIZE:
+            _structured_models.popitem(last=False)
+    return structured_model
+
 def llm_call_with_so(model: ChatOpenAI, prompt: str, output_format: BaseModel) -> BaseModel:
-    model = model.with_structured_output(output_format)
+    model = _bind_structured_output(model, output_format)
     response = model.invoke(prompt)
     return response
 
+def _save_failed_prompt(prompt: str, attempts: int):
+    """Save the prompt of a failed LLM call to a file for debugging."""
+    os.makedirs("./logs", exist_ok=True)
+    with open(f"./logs/last_prompt_after_{attempts}_tries.txt", "w", encoding="utf-8") as f:
+        f.write(prompt)
+
 def llm_call_with_so_and_fallback(model: ChatOpenAI, prompt: str, output_format: BaseModel,
                                   num_retries: int = 5,
                                   fallback_model_id="google/gemini-2.5-flash",
                                   provider="openrouter") -> BaseModel:
+    """
+    Calls the model with structured output, retrying with exponential backoff and jitter.
+    The last two attempts use the fallback model; a request the model rejects outright
+    switches to it right away, and authentication/permission errors are raised immediately.
+    """
+    using_fallback = False
     for attempt in range(num_retries):
-        # for last attempt use fallback model
-        if attempt == num_retries - 2:
-            # save prompt to a file for debugging
-            os.makedirs("./logs", exist_ok=True)
-            with open(f"./logs/last_prompt_after_{attempt}_tries.txt", "w", encoding="utf-8") as f:
-                f.write(prompt)
-            # switch to fallback model
-            logger.warning("Using fallback model for the last attempt.")
+        # for the last attempts use fallback model
+        if attempt == num_retries - 2 and not using_fallback:
+            logger.warning("Using fallback model for the last attempts.")
             model = get_llm(fallback_model_id, max_tokens=28000)
-            test_call = model.invoke(prompt)
-            logger.info(f"Fallback model response (truncated): {test_call}...")
+            using_fallback = True
         try:
-            return llm_call_with_so(model, prompt, output_format,)
+            return llm_call_with_so(model, prompt, output_format)
+        except _NON_RETRYABLE_ERRORS as e:
+            logger.error(f"Attempt {attempt + 1} failed with a non-retryable error: {e}")
+            _save_failed_prompt(prompt, attempt + 1)
+            raise
+        except _MODEL_REJECTED_ERRORS as e:
+            logger.error(f"Attempt {attempt + 1} failed: {e}")
+            if using_fallback:
+                _save_failed_prompt(prompt, attempt + 1)
+                raise
+            # the same request would be rejected again, so go to the fallback model without waiting
+            logger.warning("Request rejected, switching to fallback model.")
+            model = get_llm(fallback_model_id, max_tokens=28000)
+            using_fallback = True
+            continue
         except Exception as e:
             logger.error(f"Attempt {attempt + 1} failed: {e}")
+
+        if attempt < num_retries - 1:
+            delay = min(RETRY_BASE_DELAY * 2 ** attempt, RETRY_MAX_DELAY) + random.uniform(0, RETRY_BASE_DELAY)
+            sleep(delay)
+
+    _save_failed_prompt(prompt, num_retries)
     raise ValueError(f"All {num_retries} attempts failed for LLM call.")
 
 # Example usage:
@@ -1,9 +1,10 @@
 # app/main.py
 import uuid
 import datetime
+from contextlib import asynccontextmanager
 import sqlparse
 from typing import Dict, Any, List, Optional
-from fastapi import FastAPI, BackgroundTasks, HTTPException, Query, Depends, Request
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Query, Header, Depends, Request, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, FileResponse
@@ -12,7 +13,7 @@ from loguru import logger
 
 from src import crud, models
 from src.database import SessionLocal, create_db_and_tables
-from src.pipeline import run_analysis_pipeline
+from src.pipeline import run_analysis_pipeline, db_log_sink
 from src.analysis_report import create_analysis_report
 
 # Define tags metadata for grouping endpoints
@@ -36,6 +37,16 @@ tags_metadata = [
     },
 ]
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prepare the database on worker startup and flush buffered task logs on shutdown."""
+    create_db_and_tables()
+    with SessionLocal() as db:
+        crud.backfill_analysis_viz(db)
+    yield
+    db_log_sink.flush()
+
+
 app = FastAPI(
     title="Database Optimizer",
     description="""
@@ -72,6 +83,7 @@ Tasks that exceed {TASK_TIMEOUT_MINUTES} minutes are automatically marked as `FA
         "email": "vvirsys@gmail.com"
     },
     openapi_tags=tags_metadata,
+    lifespan=lifespan,
     docs_url="/docs",
     redoc_url="/redoc",
     swagger_ui_parameters={
@@ -86,7 +98,6 @@ TASK_TIMEOUT_MINUTES = 20
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 logger.add("logs/app.log", level="INFO", rotation="1 week", serialize=True)
-create_db_and_tables()
 
 
 # Dependency for getting a DB session
@@ -342,6 +353,7 @@ def get_task_result(
     include_in_schema=True
 )
 def list_tasks(
+        response: Response,
         status: Optional[str] = Query(
             None,
             description="Filter tasks by status",
@@ -351,6 +363,11 @@ def list_tasks(
         skip: int = Query(0, ge=0, description="Number of tasks to skip for pagination"),
         limit: int = Query(20, ge=1, le=100, description="Maximum number of tasks to return"),
         order: str = Query("newest", description="Order of tasks by submission time", enum=["newest", "oldest"]),
+        cursor: Optional[str] = Query(
+            None,
+            description="Keyset cursor from the `X-Next-Cursor` header of the previous page "
+                        "(newest order only); takes precedence over `skip`"
+        ),
         db: Session = Depends(get_db)
 ):
     """
@@ -359,7 +376,13 @@ def list_tasks(
     Useful for monitoring multiple tasks or reviewing historical optimizations.
     """
     if order == "newest":
-        tasks = crud.get_tasks_with_newest_first(db, skip=skip, limit=limit, status=status)
+        try:
+            task_cursor = crud.decode_task_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Invalid cursor")
+        tasks = crud.get_tasks_with_newest_first(db, skip=skip, limit=limit, status=status, cursor=task_cursor)
+        if len(tasks) == limit:
+            response.headers["X-Next-Cursor"] = crud.encode_task_cursor(tasks[-1])
     else:
         tasks = crud.get_tasks(db, skip=skip, limit=limit, status=status)
     task_list = []
@@ -532,15 +555,18 @@ def get_query_diffs(
     description="Retrieve comprehensive database analysis with performance metrics and visualization data.",
     responses={
         200: {"description": "Analysis report with visualization data"},
+        304: {"description": "Report unchanged since the given ETag"},
         404: {"description": "Task not found"}
     },
     include_in_schema=True
 )
 def get_analysis_report(
         task_id: str,
+        include_raw: bool = Query(False, description="Also embed the full source report as `raw_report`"),
+        if_none_match: Optional[str] = Header(None),
         db: Session = Depends(get_db)
 ):
-    return create_analysis_report(task_id, db)
+    return create_analysis_report(task_id, db, include_raw=include_raw, if_none_match=if_none_match)
 
 
 @app.get(
@@ -1,6 +1,10 @@
 # app/models.py
-from sqlalchemy import Column, String, DateTime, JSON, ForeignKey, Integer, Text
+import zlib
+
+import orjson
+from sqlalchemy import Column, String, DateTime, JSON, ForeignKey, Integer, Text, Index, LargeBinary
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.sql import func
 from pydantic import BaseModel, Field
 from typing import List, Optional, Literal, Dict
@@ -10,19 +14,52 @@ from src.database import Base
 
 # Database Models
 
+class CompressedJSON(TypeDecorator):
+    """
+    JSON stored as zlib-compressed bytes.
+
+    Rows written before the column was compressed hold plain JSON text and are still read as-is.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    COMPRESSION_LEVEL = 6
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        payload = orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        return zlib.compress(payload, self.COMPRESSION_LEVEL)
+
+    def result_processor(self, dialect, coltype):
+        # LargeBinary would coerce the legacy JSON text to bytes, so decode the raw value directly
+        def process(value):
+            return self.process_result_value(value, dialect)
+        return process
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return orjson.loads(value)
+        return orjson.loads(zlib.decompress(value))
+
+
 class Task(Base):
     __tablename__ = "tasks"
 
     id = Column(String, primary_key=True, index=True)
     status = Column(String, index=True)
-    submitted_at = Column(DateTime, default=datetime.datetime.now(datetime.UTC))
+    submitted_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.UTC))
     completed_at = Column(DateTime, nullable=True)
 
     # Stores the original POST /new request body
     original_input = Column(JSON)
 
     # Stores the JSON report from the initial analysis step
-    db_analysis_report = Column(JSON, nullable=True)
+    db_analysis_report = Column(CompressedJSON, nullable=True)
+    # Stores the dashboard projection of the report, built once when the report is saved
+    db_analysis_viz = Column(JSON, nullable=True)
     # Stores the raw string of optimized DDL statements from the LLM
     optimized_ddl = Column(Text, nullable=True)
     # Stores the raw string of migration statements from the LLM
@@ -34,6 +71,11 @@ class Task(Base):
 
     logs = relationship("LogEntry", back_populates="task", cascade="all, delete-orphan")
 
+    # Serves the newest-first task listing, optionally filtered by status
+    __table_args__ = (
+        Index("ix_task_status_submitted", "status", submitted_at.desc()),
+    )
+
 class TaskInfoFromDB(BaseModel):
     """All info from DB Task model except logs (for summary endpoints)"""
     id: str
@@ -1,5 +1,10 @@
 # app/pipeline.py
 import json
+import atexit
+import datetime
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from time import time
 from dotenv import load_dotenv, find_dotenv
 from loguru import logger
@@ -17,24 +22,78 @@ from src.offline_fallback import fallback_analysis
 # Load environment variables once
 load_dotenv(find_dotenv())
 
+# Query rewrite batches sent to the LLM at the same time
+QUERY_REWRITE_CONCURRENCY = 4
+
 # DB Logger Sink
-def db_log_sink(msg):
-    record = msg.record
-    # The 'extra' field is where we'll put the task_id
-    task_id = record["extra"].get("task_id")
-    if task_id:
-        db: Session = SessionLocal()
-        try:
-            crud.create_log_entry(
-                db=db,
-                task_id=task_id,
-                level=record["level"].name,
-                message=record["message"]
-            )
-        finally:
-            db.close()
+class DBLogBuffer:
+    """
+    Loguru sink that buffers task log lines and writes them to the DB in batches.
 
+    A batch is flushed once `max_entries` lines are pending or `max_delay` seconds
+    after the first pending line, so the live log view lags by at most `max_delay`.
+    Flushes always run outside the sink call: loguru handlers are not re-entrant,
+    so a failed write can only be reported from there. They also run one at a time,
+    so batches are committed in the order they were taken.
+    """
+
+    def __init__(self, max_entries: int = 50, max_delay: float = 2.0):
+        self.max_entries = max_entries
+        self.max_delay = max_delay
+        self._entries = defaultdict(list)
+        self._pending = 0
+        self._timer = None
+        self._lock = threading.Lock()
+        # Held for the whole flush; `_lock` only guards the pending entries
+        self._flush_lock = threading.Lock()
+
+    def __call__(self, msg):
+        record = msg.record
+        # The 'extra' field is where we'll put the task_id
+        task_id = record["extra"].get("task_id")
+        if not task_id:
+            return
+        # Stored as naive UTC, like the server-side CURRENT_TIMESTAMP default
+        timestamp = record["time"].astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        with self._lock:
+            self._entries[task_id].append((timestamp, record["level"].name, record["message"]))
+            self._pending += 1
+            flush_now = self._pending >= self.max_entries
+            if not flush_now and self._timer is None:
+                self._timer = threading.Timer(self.max_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if flush_now:
+            threading.Thread(target=self.flush, daemon=True).start()
+
+    def flush(self):
+        """Write all pending log lines, one commit per task."""
+        with self._flush_lock:
+            with self._lock:
+                entries, self._entries = self._entries, defaultdict(list)
+                self._pending = 0
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not entries:
+                return
+            db: Session = SessionLocal()
+            try:
+                for task_id, task_entries in entries.items():
+                    try:
+                        crud.create_log_entries(db, task_id, task_entries)
+                    except Exception:
+                        db.rollback()
+                        # No task_id bound, so this goes to stderr/app.log and not back into this sink
+                        logger.exception(f"Failed to write {len(task_entries)} log lines for task {task_id} to the DB")
+            finally:
+                db.close()
+
+
+db_log_sink = DBLogBuffer()
 logger.add(db_log_sink, format="{message}", level="INFO")
+# Don't lose lines still waiting for the timer when the worker exits
+atexit.register(db_log_sink.flush)
 
 
 def run_analysis_pipeline(task_id: str, request_data: models.NewTaskRequest):
@@ -163,9 +222,8 @@ def run_analysis_pipeline(task_id: str, request_data: models.NewTaskRequest):
                 f"[{task_id}] Large number of queries detected ({total_queries}). "
                 f"Processing in batches of {BATCH_SIZE}."
             )
-            all_rewritten_queries = []
 
-            for i in range(0, total_queries, BATCH_SIZE):
+            def rewrite_batch(i: int) -> list:
                 batch_end = min(i + BATCH_SIZE, total_queries)
                 batch_num = (i // BATCH_SIZE) + 1
                 batch_size = batch_end - i
@@ -212,7 +270,15 @@ def run_analysis_pipeline(task_id: str, request_data: models.NewTaskRequest):
                         empty_queries_to_add = batch_size - len(batch_response.queries)
                         batch_response.queries.extend([""] * empty_queries_to_add)
 
-                all_rewritten_queries.extend(batch_response.queries)
+                return batch_response.queries
+
+            # Batches only share the new DDL, so their LLM calls run concurrently;
+            # map keeps the batch order
+            batch_starts = range(0, total_queries, BATCH_SIZE)
+            all_rewritten_queries = []
+            with ThreadPoolExecutor(max_workers=min(len(batch_starts), QUERY_REWRITE_CONCURRENCY)) as executor:
+                for batch_queries in executor.map(rewrite_batch, batch_starts):
+                    all_rewritten_queries.extend(batch_queries)
 
             rewrite_response = models.RewrittenQueries(queries=all_rewritten_queries)
         else:
@@ -254,3 +320,4 @@ def run_analysis_pipeline(task_id: str, request_data: models.NewTaskRequest):
     finally:
         db.close()
         log.info(f"[{task_id}] Pipeline finished and database session closed.")
+        db_log_sink.flush()
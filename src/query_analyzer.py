@@ -25,6 +25,21 @@ class QueryPattern:
     run_quantity: int
     execution_time: float
 
+    def to_dict(self) -> Dict:
+        """Проекция паттерна запроса для результата анализа"""
+        return {
+            'query_id': self.query_id,
+            'type': self.query_type,
+            'tables_used': list(self.tables_used),
+            'joins': self.joins,
+            'aggregations': self.aggregations,
+            'group_by_columns': list(self.group_by_columns),
+            'filter_columns': list(self.filter_columns),
+            'cte_usage': self.cte_usage,
+            'run_quantity': self.run_quantity,
+            'execution_time': self.execution_time,
+        }
+
 
 class QueryAnalyzer:
     def __init__(self):
@@ -27,7 +27,7 @@ function renderAnalysis(data) {
     const metrics = Array.isArray(exec.metrics) ? exec.metrics : [];
     const optPotential = exec.optimization_potential || (raw.executive_summary ? raw.executive_summary.optimization_potential : '—');
 
-    const totalRowsNumeric = raw?.database_profile?.total_rows_numeric || 0;
+    const totalRowsNumeric = exec.total_rows_numeric ?? raw?.database_profile?.total_rows_numeric ?? 0;
 
     const qp = viz.query_performance || {};
     const topQueries = Array.isArray(qp.top_queries) ? qp.top_queries : [];
@@ -44,7 +44,7 @@ function renderAnalysis(data) {
     const recs = (viz.recommendations && Array.isArray(viz.recommendations.priority_matrix)) ? viz.recommendations.priority_matrix : [];
     const implOrder = (viz.recommendations && Array.isArray(viz.recommendations.implementation_order)) ? viz.recommendations.implementation_order : [];
 
-    const ctePct = raw?.query_patterns?.cte_usage_percent ?? null;
+    const ctePct = qp.cte_usage_percent ?? raw?.query_patterns?.cte_usage_percent ?? null;
 
     root.innerHTML = `
         <div class="row g-3">
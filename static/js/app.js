@@ -290,11 +290,11 @@ async function handleTabContent(tabElement) {
                 document.getElementById('optimized-schema-viz').innerHTML = ``;
             }
         } else if (tabId === '#schema') {
-            const schemaData = analysisReportCache?.raw_report?.schema_overview;
+            const schemaData = analysisReportCache?.schema_overview ?? analysisReportCache?.raw_report?.schema_overview;
             if (schemaData) {
                 renderSchemaOverview(schemaData);
             } else {
-                document.getElementById('schema-root').innerHTML = '<div class="alert alert-warning">Schema data (`raw_report.schema_overview`) was not found.</div>';
+                document.getElementById('schema-root').innerHTML = '<div class="alert alert-warning">Schema data (`schema_overview`) was not found.</div>';
             }
         } else if (tabId === '#analysis') {
             renderAnalysis(analysisReportCache);
@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Tests import the application as the `src` package, like the app itself does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Keep the app database out of the working tree; set before `src.database` is imported
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.sqlite3")
+
+
+@pytest.fixture
+def db():
+    """A session on a freshly created app database, emptied again after the test."""
+    from src import models
+    from src.database import SessionLocal, create_db_and_tables
+
+    create_db_and_tables()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.query(models.LogEntry).delete()
+        session.query(models.Task).delete()
+        session.commit()
+        session.close()
@@ -0,0 +1,60 @@
+import datetime
+
+import orjson
+import pytest
+
+from src import crud, models
+from src.analysis_report import _etag_matches, create_analysis_report
+
+
+@pytest.fixture
+def finished_task(db):
+    request = models.NewTaskRequest(url="jdbc:trino://host:443", ddl=[], queries=[])
+    crud.create_task(db, "t1", request)
+    crud._update_task(
+        db, "t1",
+        db_analysis_report={"schema_overview": {}},
+        db_analysis_viz={"visualizations": {"tables": 1}},
+    )
+    crud.update_task_status(db, "t1", "DONE")
+    return "t1"
+
+
+def test_report_is_revalidated_until_completed_at_moves(db, finished_task):
+    first = create_analysis_report(finished_task, db)
+    assert first.status_code == 200
+    assert orjson.loads(first.body) == {"visualizations": {"tables": 1}}
+    etag = first.headers["etag"]
+
+    not_modified = create_analysis_report(finished_task, db, if_none_match=etag)
+    assert not_modified.status_code == 304
+    assert not_modified.body == b""
+    assert not_modified.headers["etag"] == etag
+
+    crud._update_task(db, finished_task, completed_at=datetime.datetime(2030, 1, 1))
+    changed = create_analysis_report(finished_task, db, if_none_match=etag)
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_raw_variant_has_its_own_etag(db, finished_task):
+    etag = create_analysis_report(finished_task, db).headers["etag"]
+    raw = create_analysis_report(finished_task, db, include_raw=True, if_none_match=etag)
+    assert raw.status_code == 200
+    assert orjson.loads(raw.body)["raw_report"] == {"schema_overview": {}}
+
+
+@pytest.mark.parametrize("header", [
+    '"t1-1"',
+    'W/"t1-1"',
+    '"other", "t1-1"',
+    '"other",W/"t1-1"',
+    '*',
+])
+def test_etag_matches(header):
+    assert _etag_matches(header, '"t1-1"')
+
+
+@pytest.mark.parametrize("header", [None, "", '"t1-2"', '"t1-1-raw"', 't1-1'])
+def test_etag_does_not_match(header):
+    assert not _etag_matches(header, '"t1-1"')
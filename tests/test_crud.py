@@ -0,0 +1,108 @@
+import datetime
+
+import pytest
+
+from src import analysis_report, crud, models
+
+
+def _new_task(db, task_id):
+    request = models.NewTaskRequest(url="jdbc:trino://host:443", ddl=[], queries=[])
+    return crud.create_task(db, task_id, request)
+
+
+def test_backfill_marks_failed_projection_and_does_not_retry_it(db, monkeypatch):
+    calls = []
+
+    def failing_projection(report):
+        calls.append(report)
+        raise ValueError("unexpected report shape")
+
+    monkeypatch.setattr(analysis_report, "build_analysis_viz", failing_projection)
+    _new_task(db, "t1")
+    crud.update_task_with_analysis(db, "t1", {"schema_overview": {}})
+    assert len(calls) == 1
+
+    assert crud.backfill_analysis_viz(db) == 0
+    assert len(calls) == 1
+    db.expire_all()
+    assert db.get(models.Task, "t1").db_analysis_viz == {}
+
+
+def test_backfill_marks_legacy_row_once(db, monkeypatch):
+    calls = []
+
+    def failing_projection(report):
+        calls.append(report)
+        raise ValueError("unexpected report shape")
+
+    _new_task(db, "t1")
+    crud._update_task(db, "t1", db_analysis_report={"schema_overview": {}})
+    monkeypatch.setattr(analysis_report, "build_analysis_viz", failing_projection)
+
+    assert crud.backfill_analysis_viz(db) == 1
+    assert crud.backfill_analysis_viz(db) == 0
+    assert len(calls) == 1
+
+
+def _task_at(db, task_id, submitted_at, status="DONE"):
+    _new_task(db, task_id)
+    crud._update_task(db, task_id, submitted_at=submitted_at, status=status)
+
+
+def _pages(db, limit, **filters):
+    pages, cursor = [], None
+    while True:
+        tasks = crud.get_tasks_with_newest_first(db, limit=limit, cursor=cursor, **filters)
+        pages.append([task.id for task in tasks])
+        if len(tasks) < limit:
+            return pages
+        cursor = crud.decode_task_cursor(crud.encode_task_cursor(tasks[-1]))
+
+
+def test_cursor_round_trip():
+    task = models.Task(id="a|b", submitted_at=datetime.datetime(2025, 3, 1, 12, 30, 5, 123456))
+
+    assert crud.decode_task_cursor(crud.encode_task_cursor(task)) == (task.submitted_at, "a|b")
+
+
+def test_cursor_pages_match_offset_order_with_ties(db):
+    same_time = datetime.datetime(2025, 1, 2, 10, 0)
+    _task_at(db, "a", datetime.datetime(2025, 1, 1))
+    for task_id in ("b", "c", "d", "e"):
+        _task_at(db, task_id, same_time)
+    _task_at(db, "f", datetime.datetime(2025, 1, 3))
+
+    pages = _pages(db, limit=2)
+
+    assert pages == [["f", "e"], ["d", "c"], ["b", "a"], []]
+    expected = [task.id for task in crud.get_tasks_with_newest_first(db, limit=100)]
+    assert sum(pages, []) == expected
+
+
+def test_cursor_pages_respect_status_filter(db):
+    same_time = datetime.datetime(2025, 1, 2)
+    for task_id, status in (("a", "DONE"), ("b", "FAILED"), ("c", "DONE"), ("d", "DONE")):
+        _task_at(db, task_id, same_time, status)
+
+    assert _pages(db, limit=2, status="DONE") == [["d", "c"], ["a"]]
+
+
+@pytest.mark.parametrize("cursor", ["garbage", "not-a-date|t1", "|"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        crud.decode_task_cursor(cursor)
+
+
+def test_task_logs_are_returned_in_order(db):
+    _new_task(db, "t1")
+    at = datetime.datetime(2025, 1, 1, 12, 0)
+    crud.create_log_entries(db, "t1", [
+        (at + datetime.timedelta(seconds=2), "INFO", "third"),
+        (at, "INFO", "first"),
+        (at + datetime.timedelta(seconds=1), "INFO", "second a"),
+        (at + datetime.timedelta(seconds=1), "INFO", "second b"),
+    ])
+
+    assert [entry.message for entry in crud.get_logs_for_task(db, "t1")] == [
+        "first", "second a", "second b", "third"
+    ]
@@ -0,0 +1,94 @@
+import pytest
+
+from src import dashboard_utils
+
+DDL = [
+    {"statement": "CREATE TABLE cat.public.flights (id bigint, airline varchar, price decimal(10,2)) WITH (format = 'PARQUET')"},
+    {"statement": "CREATE TABLE cat.public.airlines (code varchar, name varchar) WITH (format = 'PARQUET')"},
+]
+QUERIES = [
+    {"queryid": "q1", "query": "SELECT airline, COUNT(*) FROM cat.public.flights GROUP BY airline", "runquantity": 10},
+    {"queryid": "q2", "query": "SELECT * FROM cat.public.flights f JOIN cat.public.airlines a ON f.airline = a.code",
+     "runquantity": 3},
+]
+
+
+@pytest.fixture
+def scan_calls(monkeypatch):
+    """Count how often the DDL scan behind the report actually runs."""
+    calls = []
+    scan_schema = dashboard_utils._scan_schema
+
+    def counting_scan(parser, ddl_statements):
+        calls.append(ddl_statements)
+        return scan_schema(parser, ddl_statements)
+
+    monkeypatch.setattr(dashboard_utils, "_scan_schema", counting_scan)
+    monkeypatch.setattr(dashboard_utils, "_insights_cache", type(dashboard_utils._insights_cache)())
+    return calls
+
+
+def test_identical_inputs_skip_the_scan(scan_calls):
+    first = dashboard_utils.create_insights_report(DDL, QUERIES)
+    # Equal content in fresh objects, as a new task with the same input would pass
+    second = dashboard_utils.create_insights_report([dict(d) for d in DDL], [dict(q) for q in QUERIES])
+
+    assert len(scan_calls) == 1
+    assert second is first
+    assert first["total_tables"] == 2
+
+
+def test_dict_key_order_does_not_change_the_key(scan_calls):
+    reordered = [{key: query[key] for key in reversed(list(query))} for query in QUERIES]
+    dashboard_utils.create_insights_report(DDL, QUERIES)
+    dashboard_utils.create_insights_report(DDL, reordered)
+
+    assert len(scan_calls) == 1
+
+
+def test_changed_inputs_are_rebuilt(scan_calls):
+    first = dashboard_utils.create_insights_report(DDL, QUERIES)
+    second = dashboard_utils.create_insights_report(DDL[:1], QUERIES)
+
+    assert len(scan_calls) == 2
+    assert (first["total_tables"], second["total_tables"]) == (2, 1)
+
+
+def test_least_recently_used_report_is_evicted(scan_calls, monkeypatch):
+    monkeypatch.setattr(dashboard_utils, "INSIGHTS_CACHE_SIZE", 2)
+    inputs = [DDL, DDL[:1], DDL[1:]]
+    for ddl in inputs:
+        dashboard_utils.create_insights_report(ddl, QUERIES)
+    dashboard_utils.create_insights_report(DDL, QUERIES)
+
+    assert len(scan_calls) == 4
+
+
+def test_report_carries_the_content_etag(scan_calls):
+    report = dashboard_utils.create_insights_report(DDL, QUERIES)
+
+    assert report["etag"] == dashboard_utils.insights_etag(DDL, QUERIES)
+    assert len(report["etag"]) == 32
+    assert dashboard_utils.insights_etag(DDL[:1], QUERIES) != report["etag"]
+
+
+def _coverage(top_k=None):
+    parser = dashboard_utils.DDLParser()
+    ddl = DDL + [{"statement": "CREATE TABLE cat.public.routes (id bigint) WITH (format = 'PARQUET')"}]
+    queries = QUERIES + [{"queryid": "q3", "query": "SELECT * FROM cat.public.airlines", "runquantity": 7}]
+    schema_scan = dashboard_utils._scan_schema(parser, ddl)
+    query_scan = dashboard_utils._scan_queries(
+        dashboard_utils._normalize_queries(queries), schema_scan.known_keys, schema_scan.known_canons)
+    return dashboard_utils._analyze_query_coverage(
+        schema_scan.tables, queries, schema_scan.known_canons, query_scan, top_k=top_k)
+
+
+def test_query_coverage_top_k_matches_the_head_of_the_full_sort():
+    full = _coverage()
+    top = _coverage(top_k=2)
+
+    assert list(full["table_usage"].items())[:2] == list(top["table_usage"].items())
+    assert len(full["table_usage"]) == 3
+    assert top["most_queried_table"] == full["most_queried_table"]
+    assert top["most_queried_count"] == full["most_queried_count"] == 13
+    assert top["unused_tables"] == full["unused_tables"]
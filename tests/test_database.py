@@ -0,0 +1,12 @@
+from sqlalchemy import inspect, text
+
+from src.database import create_db_and_tables, engine
+
+
+def test_create_db_and_tables_adds_missing_columns(db):
+    with engine.begin() as conn:
+        conn.execute(text('ALTER TABLE tasks DROP COLUMN db_analysis_viz'))
+    create_db_and_tables()
+
+    columns = {c['name'] for c in inspect(engine).get_columns('tasks')}
+    assert 'db_analysis_viz' in columns
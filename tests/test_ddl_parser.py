@@ -0,0 +1,50 @@
+from src.ddl_parser import DDLParser
+
+
+def _parse(statement):
+    return DDLParser().parse_ddl_statements([{"statement": statement}])
+
+
+def test_if_not_exists_is_not_part_of_the_table_name():
+    tables = _parse("CREATE TABLE IF NOT EXISTS cat.sch.orders (id bigint, note varchar)")
+
+    assert len(tables) == 1
+    table = tables[0]
+    assert (table.catalog, table.schema, table.name) == ("cat", "sch", "orders")
+    assert [c.name for c in table.columns] == ["id", "note"]
+
+
+def test_if_not_exists_is_case_insensitive():
+    tables = _parse("create table if not exists cat.sch.orders (id bigint)")
+
+    assert tables[0].name == "orders"
+    assert [c.name for c in tables[0].columns] == ["id"]
+
+
+def test_commas_inside_nested_parens_do_not_split_columns():
+    tables = _parse(
+        "CREATE TABLE cat.sch.t ("
+        "amount decimal(10, 2), "
+        "payload row(a int, b row(c varchar, d decimal(5, 1))), "
+        "tags array(varchar)"
+        ") WITH (format = 'PARQUET', partitioning = ARRAY['tags'])"
+    )
+
+    columns = {c.name: c.data_type for c in tables[0].columns}
+    assert columns == {
+        "amount": "decimal(10, 2)",
+        "payload": "row(a int, b row(c varchar, d decimal(5, 1)))",
+        "tags": "array(varchar)",
+    }
+
+
+def test_table_without_column_list_has_no_columns():
+    tables = _parse("CREATE TABLE cat.sch.t AS SELECT (1) AS x")
+
+    assert tables[0].name == "t"
+    assert tables[0].columns == ()
+
+
+def test_non_create_statements_are_skipped():
+    assert _parse("ALTER TABLE cat.sch.t ADD COLUMN x int") == []
+    assert _parse("") == []
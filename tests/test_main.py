@@ -0,0 +1,34 @@
+import datetime
+
+from fastapi.testclient import TestClient
+
+from src import crud, models
+from src.main import app
+
+
+def test_malformed_cursor_returns_422(db):
+    with TestClient(app) as client:
+        response = client.get("/tasks", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 422
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+def test_next_cursor_header_pages_through_tasks(db):
+    request = models.NewTaskRequest(url="jdbc:trino://host:443", ddl=[], queries=[])
+    for task_id in ("a", "b", "c"):
+        crud.create_task(db, task_id, request)
+        crud._update_task(db, task_id, submitted_at=datetime.datetime(2025, 1, 1))
+
+    seen = []
+    with TestClient(app) as client:
+        params = {"limit": 2}
+        while True:
+            response = client.get("/tasks", params=params)
+            assert response.status_code == 200
+            seen += [task["taskid"] for task in response.json()]
+            if "x-next-cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["x-next-cursor"]
+
+    assert seen == ["c", "b", "a"]
@@ -0,0 +1,44 @@
+import zlib
+
+import numpy as np
+import orjson
+from sqlalchemy import select, text
+
+from src import crud, models
+
+
+def _new_task(db, task_id):
+    request = models.NewTaskRequest(url="jdbc:trino://host:443", ddl=[], queries=[])
+    crud.create_task(db, task_id, request)
+
+
+def test_compressed_json_round_trip(db):
+    _new_task(db, "t1")
+    report = {"schema_overview": {"tables": 2}, "sizes": np.array([1, 2]), 3: "non-str key"}
+    crud._update_task(db, "t1", db_analysis_report=report)
+
+    stored = db.execute(text("SELECT db_analysis_report FROM tasks WHERE id = 't1'")).scalar_one()
+    assert isinstance(stored, bytes)
+    assert orjson.loads(zlib.decompress(stored))["schema_overview"] == {"tables": 2}
+
+    loaded = db.scalar(select(models.Task.db_analysis_report).where(models.Task.id == "t1"))
+    assert loaded == {"schema_overview": {"tables": 2}, "sizes": [1, 2], "3": "non-str key"}
+
+
+def test_compressed_json_reads_legacy_text_rows(db):
+    _new_task(db, "t1")
+    # Rows written before compression hold the plain JSON text
+    db.execute(
+        text("UPDATE tasks SET db_analysis_report = :report WHERE id = 't1'"),
+        {"report": '{"schema_overview": {"tables": 1}, "name": "\\u0436"}'},
+    )
+    db.commit()
+
+    task = db.get(models.Task, "t1")
+    assert task.db_analysis_report == {"schema_overview": {"tables": 1}, "name": "ж"}
+
+
+def test_compressed_json_keeps_null(db):
+    _new_task(db, "t1")
+
+    assert db.get(models.Task, "t1").db_analysis_report is None
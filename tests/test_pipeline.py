@@ -0,0 +1,56 @@
+import threading
+import time
+
+from loguru import logger
+
+from src import crud, pipeline
+
+
+def test_failed_log_flush_is_reported_not_dropped_silently(monkeypatch):
+    def failing_insert(db, task_id, entries):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(crud, "create_log_entries", failing_insert)
+    messages = []
+    handler_id = logger.add(messages.append, format="{message}", level="ERROR")
+    try:
+        logger.bind(task_id="t1").info("step 1")
+        pipeline.db_log_sink.flush()
+    finally:
+        logger.remove(handler_id)
+
+    assert len(messages) == 1
+    assert "Failed to write 1 log lines for task t1" in messages[0]
+    assert "database is locked" in messages[0]
+
+
+def test_flushes_run_one_at_a_time_in_order(monkeypatch):
+    active, overlaps, written = [], [], []
+    first_write_started = threading.Event()
+
+    def slow_insert(db, task_id, entries):
+        active.append(task_id)
+        overlaps.append(len(active))
+        first_write_started.set()
+        time.sleep(0.05)
+        written.extend(message for _, _, message in entries)
+        active.remove(task_id)
+
+    monkeypatch.setattr(crud, "create_log_entries", slow_insert)
+    buffer = pipeline.DBLogBuffer(max_delay=60)
+    sink_id = logger.add(buffer, format="{message}", level="INFO")
+    try:
+        logger.bind(task_id="t1").info("line 1")
+        first = threading.Thread(target=buffer.flush)
+        first.start()
+        first_write_started.wait(1)
+        logger.bind(task_id="t1").info("line 2")
+        second = threading.Thread(target=buffer.flush)
+        second.start()
+        first.join()
+        second.join()
+    finally:
+        logger.remove(sink_id)
+
+    assert overlaps == [1, 1]
+    assert written == ["line 1", "line 2"]